@@ -0,0 +1,103 @@
+import gc
+import os
+import tracemalloc
+from collections.abc import Callable
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("DATABASE_PATH", "sqlite://")
+
+from langchain.schema import AIMessage, HumanMessage
+
+from medrzec_ai.conversations import FLOW_COSTS, estimate_size
+from medrzec_ai.database import Database
+from medrzec_ai.flows import snapshots
+from medrzec_ai.flows.flow import Flow
+from medrzec_ai.flows.playbook_chat import PlaybookChat
+from medrzec_ai.flows.question_chat import QuestionChat
+from medrzec_ai.flows.remote_work_score import RemoteWorkScoreChat, TeamRoles
+from medrzec_ai.flows.sales_agent_flow import SalesAgentChat
+from medrzec_ai.utils.text_utils import TextFormat
+
+# usage: python -m benchmarks.conversation_memory
+# the heap a fresh chat of each type takes, and what each byte of serialized
+# history costs once it's in memory; the source of FLOW_COSTS in
+# medrzec_ai/conversations.py, re-run it after changing what a flow holds
+
+CHATS = 50
+TURNS = 20
+REPLY = "Thanks for sharing! 🙌 " * 20
+
+db = Database()
+
+
+def add_playbook_history(chat: PlaybookChat) -> None:
+    for i in range(TURNS):
+        chat.memory.chat_memory.messages += [
+            HumanMessage(content=f"We have {i} meetings a day, what should I do?"),
+            AIMessage(content=REPLY),
+        ]
+
+
+def add_question_history(chat: QuestionChat) -> None:
+    for i in range(TURNS):
+        chat.memory.chat_memory.messages += [
+            AIMessage(content=f"Question {i}: {REPLY}"),
+            HumanMessage(content="I'd say 4, we mostly work async"),
+        ]
+
+
+def add_score_history(chat: RemoteWorkScoreChat) -> None:
+    for i in range(TURNS):
+        chat.memory.add_message(f"{i}. {REPLY}")
+
+
+def add_sales_history(chat: SalesAgentChat) -> None:
+    for i in range(TURNS):
+        chat.agent.conversation_history += [f"User: answer {i}", f"AI: {REPLY}"]
+
+
+FLOWS: list[tuple[Callable[[], Flow], Callable]] = [
+    (PlaybookChat, add_playbook_history),
+    (QuestionChat, add_question_history),
+    (
+        lambda: RemoteWorkScoreChat(TeamRoles.PEOPLE_LEADER, TextFormat.MARKDOWN),
+        add_score_history,
+    ),
+    (lambda: SalesAgentChat(db, None, "token"), add_sales_history),
+]
+
+
+def allocated(action: Callable[[], object]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = action()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return after - before
+
+
+print(
+    f"{'flow':>20} {'base':>7} {'configured':>10}"
+    f" {'per byte':>8} {'configured':>10} {'estimate':>9} {'measured':>9}"
+)
+
+for make, add_history in FLOWS:
+    # the first chat also builds what all chats share, e.g. the LLM clients
+    make()
+    chats: list[Flow] = []
+    base = allocated(lambda: chats.extend(make() for _ in range(CHATS))) // CHATS
+
+    empty = len(snapshots.encode_flow(chats[0], 1))
+    history = allocated(lambda: [add_history(chat) for chat in chats]) // CHATS
+    state_bytes = len(snapshots.encode_flow(chats[0], 1)) - empty
+
+    name = type(chats[0]).__name__
+    configured_base, configured_per_byte = FLOW_COSTS[name]
+    print(
+        f"{name:>20} {base:>7} {configured_base:>10}"
+        f" {history / state_bytes:>8.1f} {configured_per_byte:>10}"
+        f" {estimate_size(chats[0], state_bytes + empty):>9} {base + history:>9}"
+    )
@@ -0,0 +1,61 @@
+import os
+import timeit
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("DATABASE_PATH", "sqlite://")
+
+from langchain.schema import AIMessage, HumanMessage
+
+from medrzec_ai.database import Database
+from medrzec_ai.flows import snapshots
+from medrzec_ai.flows.flow import Flow
+from medrzec_ai.flows.question_and_playbook_chat import QuestionAndPlaybookChat
+from medrzec_ai.flows.remote_work_score import TeamRoles
+from medrzec_ai.flows.remote_work_score_and_playbook import (
+    RemoteWorkScoreAndPlaybookChat,
+)
+from medrzec_ai.flows.sales_agent_flow import SalesAgentChat
+from medrzec_ai.utils.text_utils import TextFormat
+
+TURNS = 20
+REPLY = "Thanks for sharing! 🙌 " * 20
+
+db = Database()
+
+score_chat = RemoteWorkScoreAndPlaybookChat(
+    TeamRoles.PEOPLE_LEADER, TextFormat.MARKDOWN
+)
+score_chat.flow.answers = [i % 5 for i in range(TURNS)]
+for i in range(TURNS):
+    score_chat.flow.memory.add_message(f"{i}. {REPLY}")
+
+question_chat = QuestionAndPlaybookChat(TextFormat.MARKDOWN)
+for i in range(TURNS):
+    question_chat.flow.memory.chat_memory.messages += [
+        AIMessage(content=f"Question {i}: {REPLY}"),
+        HumanMessage(content="I'd say 4, we mostly work async"),
+    ]
+
+sales_chat = SalesAgentChat(db, None, "token")
+sales_chat.agent.current_stage = 3
+for i in range(TURNS):
+    sales_chat.agent.conversation_history += [f"User: answer {i}", f"AI: {REPLY}"]
+
+
+def restore(data: bytes) -> Flow:
+    _, snapshot = snapshots.load_snapshot(data)
+    return snapshots.restore_flow(snapshot, db)
+
+
+print(f"{'flow':>32} {'bytes':>7} {'dump':>10} {'restore':>10}")
+
+for flow in [score_chat, question_chat, sales_chat]:
+    data = snapshots.dump_flow(flow, 1)
+    assert restore(data).get_state() == flow.get_state()
+
+    dump = timeit.Timer(lambda: snapshots.dump_flow(flow, 1)).autorange()
+    load = timeit.Timer(lambda: restore(data)).autorange()
+    print(
+        f"{type(flow).__name__:>32} {len(data):>7}"
+        f" {dump[1] / dump[0] * 1e6:>7.0f} µs {load[1] / load[0] * 1e6:>7.0f} µs"
+    )
@@ -0,0 +1,128 @@
+import asyncio
+import os
+import random
+import tempfile
+import time
+from collections.abc import Awaitable, Callable, Sequence
+
+from sqlalchemy import create_engine, insert, select, text
+from sqlalchemy.orm import Session
+
+from medrzec_ai.database import Base, Database, Purchase, User
+
+# usage: python -m benchmarks.database_concurrency
+# concurrent chat turns each look up the user's purchases, like POST /chats
+# and the sales agent do, then wait for a simulated LLM call; a request
+# without database access (e.g. GET /) measures how long the event loop stalls,
+# as how late a short sleep wakes up. The purchase table has no user_id index,
+# as before the lookup indexes, so that each lookup takes long enough for a
+# blocked event loop to show. With a single CPU the async variant's pings are
+# also late while the query threads hold the CPU, without the loop being blocked
+
+USERS = 1000
+PURCHASES = 200_000
+CHATS = 20
+TURNS = 10
+LLM_SECONDS = 0.5
+PING_SECONDS = 0.001
+
+rng = random.Random(0)
+
+
+class BlockingDatabase:
+    # the previous implementation, a synchronous Session in the event loop
+    def __init__(self, url: str) -> None:
+        self.engine = create_engine(url)
+
+    async def get_purchases(self, user_id: int) -> Sequence[Purchase]:
+        with Session(self.engine) as session:
+            return session.scalars(
+                select(Purchase).where(Purchase.user_id == user_id)
+            ).all()
+
+
+def populate(url: str) -> None:
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        session.execute(text("DROP INDEX ix_purchase_user_id"))
+        session.execute(
+            insert(User),
+            [
+                {"email": f"user{i}@example.com", "country": "PL"}
+                | {"industry": "IT", "profession": "Manager"}
+                for i in range(USERS)
+            ],
+        )
+        session.execute(
+            insert(Purchase),
+            [{"user_id": rng.randrange(1, USERS + 1)} for _ in range(PURCHASES)],
+        )
+        session.commit()
+
+
+def percentile(latencies: list[float], fraction: float) -> float:
+    return sorted(latencies)[int(len(latencies) * fraction)] * 1000
+
+
+async def run(get_purchases: Callable[[int], Awaitable[Sequence[Purchase]]]) -> None:
+    turns: list[float] = []
+    pings: list[float] = []
+    finished = asyncio.Event()
+
+    async def chat() -> None:
+        # users don't all send their messages at the same moment
+        await asyncio.sleep(rng.uniform(0, LLM_SECONDS))
+
+        for _ in range(TURNS):
+            start = time.perf_counter()
+            await get_purchases(rng.randrange(1, USERS + 1))
+            await asyncio.sleep(LLM_SECONDS)
+            turns.append(time.perf_counter() - start)
+
+    async def ping() -> None:
+        while not finished.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(PING_SECONDS)
+            pings.append(time.perf_counter() - start - PING_SECONDS)
+
+    pinger = asyncio.create_task(ping())
+    start = time.perf_counter()
+    await asyncio.gather(*(chat() for _ in range(CHATS)))
+    elapsed = time.perf_counter() - start
+    finished.set()
+    await pinger
+
+    print(
+        f"{percentile(turns, 0.5):>9.1f} {percentile(turns, 0.99):>9.1f} "
+        f"{percentile(pings, 0.5):>9.2f} {percentile(pings, 0.99):>9.2f} "
+        f"{CHATS * TURNS / elapsed:>9.0f}"
+    )
+
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'db.sqlite')}"
+        populate(url)
+        os.environ["DATABASE_PATH"] = url
+
+        print(
+            f"{CHATS} chats x {TURNS} turns, {PURCHASES} unindexed purchases, "
+            "ping is how late a 1 ms sleep wakes up, times in ms"
+        )
+        print(
+            f"{'':>9} {'turn p50':>9} {'turn p99':>9} "
+            f"{'ping p50':>9} {'ping p99':>9} {'turns/s':>9}"
+        )
+
+        print(f"{'blocking':>9}", end=" ")
+        await run(BlockingDatabase(url).get_purchases)
+
+        database = Database()
+        print(f"{'async':>9}", end=" ")
+        await run(database.get_purchases)
+        await database.engine.dispose()
+
+
+asyncio.run(main())
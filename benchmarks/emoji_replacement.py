@@ -0,0 +1,42 @@
+import random
+import timeit
+
+from medrzec_ai.utils.text_utils import EmojiReplacer
+
+REPLY_PARAGRAPHS = 40
+
+
+def naive_replace_emojis(emojis: dict[str, str], text: str) -> str:
+    for name, emoji in emojis.items():
+        text = text.replace(name, emoji)
+
+    return text
+
+
+rng = random.Random(0)
+replacer = EmojiReplacer()
+names = list(replacer.emojis)
+
+paragraph = (
+    "## {0} Async communication\n\n"
+    "**Meetings** should have an agenda :{1} and notes — see 10:30 or 12:45{2}.\n"
+    "- Use Slack for sync {1} and Notion for async :not_an_emoji: work {3}\n\n"
+)
+reply = "".join(
+    paragraph.format(*rng.sample(names, 4)).replace(":{", "{")
+    for _ in range(REPLY_PARAGRAPHS)
+)
+
+assert replacer.replace_emojis(reply) == naive_replace_emojis(replacer.emojis, reply)
+
+print(
+    f"Reply length: {len(reply)} characters, "
+    f"table {replacer.version} with {len(names)} emojis"
+)
+
+for label, function in [
+    ("str.replace loop", lambda: naive_replace_emojis(replacer.emojis, reply)),
+    ("single pass", lambda: replacer.replace_emojis(reply)),
+]:
+    number, total = timeit.Timer(function).autorange()
+    print(f"{label:>16}: {total / number * 1e6:10.1f} µs per reply")
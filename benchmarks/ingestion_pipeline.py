@@ -0,0 +1,88 @@
+import asyncio
+import os
+import random
+import sys
+import tempfile
+
+from medrzec_ai.ingestion import Checkpoint, MemorySink, ingest, iter_chunks
+
+EMBEDDING_LATENCY = 0.1
+UPLOAD_LATENCY = 0.02
+DIMENSIONS = 1536
+PARAGRAPHS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+WORDS = "remote async meeting team trust document decision feedback".split()
+
+
+class FakeEmbedder:
+    def __init__(self, fail_after: int | None = None) -> None:
+        self.calls = 0
+        self.fail_after = fail_after
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+
+        if self.fail_after is not None and self.calls > self.fail_after:
+            raise RuntimeError("embeddings API unavailable")
+
+        await asyncio.sleep(EMBEDDING_LATENCY)
+        return [[float(len(text))] * DIMENSIONS for text in texts]
+
+
+class SlowMemorySink(MemorySink):
+    async def upsert(self, chunks, embeddings) -> None:
+        await asyncio.sleep(UPLOAD_LATENCY)
+        await super().upsert(chunks, embeddings)
+
+
+async def main(path: str, checkpoint_path: str) -> None:
+    chunks = sum(1 for _ in iter_chunks(path))
+    print(
+        f"{chunks} chunks, {EMBEDDING_LATENCY * 1000:.0f} ms per embedding batch, "
+        f"{UPLOAD_LATENCY * 1000:.0f} ms per upload"
+    )
+    print(f"{'batch size':>10} {'concurrency':>11} {'chunks/s':>10}")
+
+    for batch_size, concurrency in [(100, 1), (100, 4), (100, 8), (50, 8), (200, 8)]:
+        sink = SlowMemorySink()
+        stats = await ingest(
+            iter_chunks(path),
+            FakeEmbedder(),
+            sink,
+            batch_size=batch_size,
+            concurrency=concurrency,
+        )
+        assert len(sink.vectors) == chunks
+        print(f"{batch_size:>10} {concurrency:>11} {stats.chunks_per_second:>10.0f}")
+
+    # a run that crashes half-way through resumes from its checkpoint
+    sink = SlowMemorySink()
+    embedder = FakeEmbedder(fail_after=chunks // 200)
+
+    try:
+        await ingest(
+            iter_chunks(path), embedder, sink, checkpoint=Checkpoint(checkpoint_path)
+        )
+    except RuntimeError:
+        pass
+
+    checkpoint = Checkpoint(checkpoint_path)
+    resumed = len(checkpoint.done)
+    stats = await ingest(iter_chunks(path), FakeEmbedder(), sink, checkpoint=checkpoint)
+    assert len(sink.vectors) == chunks
+    print(
+        f"resumed after a crash: {resumed} chunks reused from the checkpoint, "
+        f"{stats.embedded} embedded"
+    )
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    random.seed(0)
+    path = os.path.join(tmp, "playbook.md")
+
+    with open(path, "w", encoding="utf8") as file:
+        for i in range(PARAGRAPHS):
+            words = random.choices(WORDS, k=random.randint(5, 40))
+            file.write(f"{i}. {' '.join(words)}\n\n")
+
+    asyncio.run(main(path, os.path.join(tmp, "checkpoint")))
@@ -0,0 +1,86 @@
+import random
+import sys
+import time
+from collections.abc import Callable
+
+from medrzec_ai.ingestion import iter_texts
+from medrzec_ai.lexical_index import LexicalIndex, tokenize
+
+# usage: python -m benchmarks.lexical_retrieval [playbook document...]
+# without documents a synthetic playbook-sized corpus is used; the queries are
+# 1-3 terms from a chunk, either its rarest ones (like "Notion" or "timezones")
+# or any of them, which is a harder test of the confidence check
+
+CHUNKS = 1000
+VOCABULARY = 5000
+WORDS_PER_CHUNK = 40
+QUERIES = 500
+K = 4
+
+rng = random.Random(0)
+
+
+def synthetic_texts() -> list[str]:
+    words = [f"word{i}" for i in range(VOCABULARY)]
+    # roughly Zipf-distributed, like natural language
+    weights = [1 / (rank + 1) for rank in range(VOCABULARY)]
+    return [
+        " ".join(rng.choices(words, weights, k=WORDS_PER_CHUNK)) for _ in range(CHUNKS)
+    ]
+
+
+def rare_terms(index: LexicalIndex, chunk: int) -> str:
+    terms = sorted(set(tokenize(index.texts[chunk])), key=index.idf, reverse=True)
+    return " ".join(terms[: rng.randint(1, 3)])
+
+
+def any_terms(index: LexicalIndex, chunk: int) -> str:
+    terms = sorted(set(tokenize(index.texts[chunk])))
+    return " ".join(rng.sample(terms, min(len(terms), rng.randint(1, 3))))
+
+
+def run(name: str, make_query: Callable[[LexicalIndex, int], str]) -> None:
+    hits, confident, confident_hits, latencies = 0, 0, 0, []
+
+    for chunk in chunks:
+        query = make_query(index, chunk)
+
+        start = time.perf_counter()
+        results = index.search(query, K)
+        is_confident = index.is_confident(query, results)
+        latencies.append(time.perf_counter() - start)
+
+        # duplicate chunks count as the same answer
+        hit = texts[chunk] in (texts[result] for result, _, _ in results)
+        hits += hit
+        confident += is_confident
+        confident_hits += is_confident and hit
+
+    latencies.sort()
+    print(
+        f"{name:>10} {hits / QUERIES:>7.3f} {confident / QUERIES:>10.3f} "
+        f"{confident_hits / max(confident, 1):>15.3f} "
+        f"{latencies[len(latencies) // 2] * 1e6:>7.0f} µs "
+        f"{latencies[int(len(latencies) * 0.99)] * 1e6:>7.0f} µs"
+    )
+
+
+if len(sys.argv) > 1:
+    texts = [text for path in sys.argv[1:] for text in iter_texts(path)]
+else:
+    texts = synthetic_texts()
+
+start = time.perf_counter()
+index = LexicalIndex.build(texts)
+build_time = time.perf_counter() - start
+
+chunks = [rng.randrange(len(texts)) for _ in range(QUERIES)]
+
+print(f"{len(texts)} chunks, {len(index.postings)} terms, built in {build_time:.2f}s")
+print(f"{QUERIES} queries, top {K}")
+print(
+    f"{'queries':>10} {'hit@' + str(K):>7} {'lexical':>10} "
+    f"{'lexical hit@' + str(K):>15} {'p50':>10} {'p99':>10}"
+)
+run("rare", rare_terms)
+run("any", any_terms)
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from medrzec_ai.database import Base, Database, Purchase, User
+
+# usage: python -m benchmarks.paid_status
+# the paid check chat starts and every sales interview turn make, for users
+# with no, one and many purchases: loading the purchases, an EXISTS query
+# with the cache cleared before every call, and the cached lookup
+
+PURCHASES = [0, 1, 100]
+OTHER_PURCHASES = 50_000
+CALLS = 200
+
+
+def populate(url: str) -> None:
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        for user_id in range(1, len(PURCHASES) + 2):
+            session.add(
+                User(
+                    id=user_id,
+                    email=f"user{user_id}@example.com",
+                    country="PL",
+                    industry="IT",
+                    profession="Manager",
+                )
+            )
+
+        purchases = [
+            user_id
+            for user_id, count in enumerate(PURCHASES, start=1)
+            for _ in range(count)
+        ]
+        # everyone else's purchases, in a separate user
+        purchases += [len(PURCHASES) + 1] * OTHER_PURCHASES
+        session.execute(insert(Purchase), [{"user_id": id} for id in purchases])
+        session.commit()
+
+    engine.dispose()
+
+
+async def run(
+    name: str, is_paid: Callable[[int], Awaitable[bool]], clear: Callable[[], None]
+) -> None:
+    print(f"{name:>9}", end="")
+
+    for user_id in range(1, len(PURCHASES) + 1):
+        await is_paid(user_id)
+        latencies = []
+
+        for _ in range(CALLS):
+            clear()
+            start = time.perf_counter()
+            await is_paid(user_id)
+            latencies.append(time.perf_counter() - start)
+
+        latencies.sort()
+        print(f" {latencies[CALLS // 2] * 1e6:>9.0f}", end="")
+
+    print()
+
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'db.sqlite')}"
+        populate(url)
+        os.environ["DATABASE_PATH"] = url
+        database = Database()
+
+        async def purchases(user_id: int) -> bool:
+            return bool(await database.get_purchases(user_id))
+
+        print(f"paid check p50 in µs, {CALLS} calls")
+        print(f"{'purchases':>9}" + "".join(f" {count:>9}" for count in PURCHASES))
+
+        await run("list", purchases, lambda: None)
+        await run("exists", database.is_paid, database.paid_status.entries.clear)
+        await run("cached", database.is_paid, lambda: None)
+
+        await database.engine.dispose()
+
+
+asyncio.run(main())
@@ -0,0 +1,118 @@
+import functools
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+
+import dotenv
+import numpy as np
+
+from medrzec_ai.local_index import LocalIndex, normalize, write_local_index
+
+# usage: python -m benchmarks.playbook_retrieval [exported index dir]
+# without a directory a synthetic playbook-sized corpus is used, with one the
+# Pinecone "playbook" index is queried too when PINECONE_API_KEY is set
+
+dotenv.load_dotenv()
+
+CHUNKS = 1000
+DIMENSIONS = 1536
+QUERIES = 200
+K = 4
+
+rng = np.random.default_rng(0)
+
+
+def synthetic_index(path: str) -> None:
+    topics = rng.normal(size=(CHUNKS // 20, DIMENSIONS))
+    embeddings = topics[rng.integers(len(topics), size=CHUNKS)]
+    embeddings += rng.normal(scale=0.8, size=embeddings.shape)
+    texts = [f"chunk {i}" for i in range(CHUNKS)]
+    write_local_index(path, texts, embeddings.tolist())
+
+
+def exact_top_k(embeddings: np.ndarray, query: np.ndarray) -> list[int]:
+    return np.argsort(-(embeddings @ query))[:K].tolist()
+
+
+def measure(
+    search: Callable[[list[float]], list[str]], queries: np.ndarray
+) -> tuple[list[list[str]], list[float]]:
+    results, latencies = [], []
+
+    for query in queries:
+        start = time.perf_counter()
+        results.append(search(query.tolist()))
+        latencies.append(time.perf_counter() - start)
+
+    return results, latencies
+
+
+def report(
+    name: str,
+    results: list[list[str]],
+    latencies: list[float],
+    expected: list[list[str]],
+) -> None:
+    recall = statistics.mean(
+        len(set(result) & set(truth)) / K for result, truth in zip(results, expected)
+    )
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2] * 1e6
+    p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+    print(f"{name:>16} {recall:>9.3f} {p50:>10.0f} µs {p99:>10.0f} µs")
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    if len(sys.argv) > 1:
+        source = sys.argv[1]
+    else:
+        source = os.path.join(tmp, "float32")
+        synthetic_index(source)
+
+    reference = LocalIndex(source)
+    vectors = np.asarray(reference.embeddings, dtype=np.float32)
+    texts = reference.texts
+
+    # queries close to, but not exactly at, existing chunks
+    queries = vectors[rng.integers(len(vectors), size=QUERIES)]
+    queries = normalize(queries + rng.normal(scale=0.02, size=queries.shape))
+    expected = [[texts[i] for i in exact_top_k(vectors, query)] for query in queries]
+
+    int8_path = os.path.join(tmp, "int8")
+    write_local_index(int8_path, texts, vectors.tolist(), dtype="int8")
+
+    backends: dict[str, Callable[[list[float]], list[str]]] = {
+        "local float32": functools.partial(LocalIndex(source).query, k=K),
+        "local int8": functools.partial(LocalIndex(int8_path).query, k=K),
+    }
+
+    try:
+        backends["local hnsw"] = functools.partial(
+            LocalIndex(source, hnsw=True).query, k=K
+        )
+    except RuntimeError as e:
+        print(f"Skipping HNSW: {e}")
+
+    if len(sys.argv) > 1 and os.getenv("PINECONE_API_KEY"):
+        import pinecone
+
+        pinecone.init(
+            os.environ["PINECONE_API_KEY"], environment=os.environ["PINECONE_ENV"]
+        )
+        index = pinecone.Index("playbook")
+
+        def pinecone_query(embedding: list[float]) -> list[str]:
+            response = index.query(vector=embedding, top_k=K, include_metadata=True)
+            return [match["metadata"]["text"] for match in response["matches"]]
+
+        backends["pinecone"] = pinecone_query
+
+    print(f"{len(texts)} chunks, {QUERIES} queries, top {K}")
+    print(f"{'backend':>16} {'recall':>9} {'p50':>13} {'p99':>13}")
+
+    for name, search in backends.items():
+        results, latencies = measure(search, queries)
+        report(name, results, latencies, expected)
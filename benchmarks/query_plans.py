@@ -0,0 +1,97 @@
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import event
+
+from medrzec_ai.agents.sales.data import InterviewTopic
+from medrzec_ai.database import Answer, Database, User
+
+# usage: python -m benchmarks.query_plans
+# migrates an empty SQLite database, runs the lookups chats make and prints
+# SQLite's plan for every query; exits with 1 if any of them scans a whole
+# table, e.g. because a migration dropped or never created an index.
+# check_query_plans returns the number of scans, for use outside the CLI
+
+EMAIL = "user@example.com"
+
+
+async def hot_queries(database: Database) -> None:
+    await database.add_user(
+        User(email=EMAIL, country="PL", industry="IT", profession="Manager")
+    )
+    user = await database.get_user(EMAIL)
+    assert user is not None
+
+    # before the purchase, which would fill the paid status cache
+    await database.is_paid(user.id)
+    await database.add_purchase(user.id)
+    # twice, so that add_answer both inserts and updates the topic's sums
+    for topic in [*InterviewTopic, *InterviewTopic]:
+        await database.add_answer(
+            Answer(
+                user_id=user.id,
+                question="How do you communicate?",
+                response="Mostly async, in Notion.",
+                topic=topic,
+                score=0.5,
+                magnitude=1.0,
+            )
+        )
+
+    await database.get_purchases(user.id)
+    await database.get_score(user)
+
+
+def full_scans(path: str, queries: dict[str, tuple]) -> int:
+    connection = sqlite3.connect(path)
+    scans = 0
+
+    for statement, parameters in queries.items():
+        print(" ".join(statement.split()))
+
+        plan = connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        for *_, detail in plan:
+            # SEARCH uses an index or the primary key, SCAN reads every row;
+            # a SELECT without FROM, like SELECT EXISTS (...), scans a constant
+            scan = detail.startswith("SCAN") and detail != "SCAN CONSTANT ROW"
+            scans += scan
+            print(f"  {detail}{'  <- full table scan' if scan else ''}")
+
+    connection.close()
+    return scans
+
+
+async def check_query_plans() -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "db.sqlite")
+        os.environ["DATABASE_PATH"] = f"sqlite:///{path}"
+        command.upgrade(Config("alembic.ini"), "head")
+
+        database = Database()
+        # statements with the parameters of their first execution
+        queries: dict[str, tuple] = {}
+
+        @event.listens_for(database.engine.sync_engine, "before_cursor_execute")
+        def capture(connection, cursor, statement, parameters, context, many):
+            sql = statement.lstrip().upper()
+
+            # add_answer's upsert has no plan to print, but it's executed, and
+            # SQLite refuses it if no unique index backs the conflict target
+            if sql.startswith(("SELECT", "UPDATE")) or "ON CONFLICT" in sql:
+                queries.setdefault(
+                    statement, tuple(parameters[0] if many else parameters)
+                )
+
+        await hot_queries(database)
+        await database.engine.dispose()
+
+        return full_scans(path, queries)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(check_query_plans()) and 1)
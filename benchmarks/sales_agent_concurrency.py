@@ -0,0 +1,74 @@
+import asyncio
+import sys
+import time
+from typing import Any
+
+from langchain.llms.fake import FakeListLLM
+
+from medrzec_ai.agents.sales.agent import Agent, ConversationChain, StageAnalyzerChain
+from medrzec_ai.utils import metrics
+
+LLM_LATENCY = 0.2
+CHATS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+TURNS = 3
+
+
+class SlowFakeLLM(FakeListLLM):
+    def _call(self, prompt: str, *args: Any, **kwargs: Any) -> str:
+        time.sleep(LLM_LATENCY)
+        return self.reply(prompt)
+
+    async def _acall(self, prompt: str, *args: Any, **kwargs: Any) -> str:
+        await asyncio.sleep(LLM_LATENCY)
+        return self.reply(prompt)
+
+    def reply(self, prompt: str) -> str:
+        if prompt.rstrip().endswith("Next conversation stage index is:"):
+            return "1"
+        return "Great, tell me more about how your team communicates."
+
+
+def create_agent(speculative: bool) -> Agent:
+    llm = SlowFakeLLM(responses=[""])
+    return Agent(
+        stage_analyzer_chain=StageAnalyzerChain.from_llm(llm),
+        conversation_chain=ConversationChain.from_llm(llm),  # type: ignore
+        speculative=speculative,
+    )
+
+
+async def sync_chat(agent: Agent) -> None:
+    for _ in range(TURNS):
+        agent.step("We mostly work asynchronously")
+
+
+async def async_chat(agent: Agent) -> None:
+    for _ in range(TURNS):
+        await agent.astep("We mostly work asynchronously")
+
+
+async def run(chat, speculative: bool) -> float:
+    agents = [create_agent(speculative) for _ in range(CHATS)]
+    start = time.perf_counter()
+    await asyncio.gather(*(chat(agent) for agent in agents))
+    return time.perf_counter() - start
+
+
+print(
+    f"{CHATS} simultaneous interviews, {TURNS} turns each, "
+    f"{LLM_LATENCY * 1000:.0f} ms per LLM call"
+)
+
+for label, chat, speculative in [
+    ("Agent.step", sync_chat, False),
+    ("Agent.astep", async_chat, False),
+    ("speculative", async_chat, True),
+]:
+    elapsed = asyncio.run(run(chat, speculative))
+    print(f"{label:>12}: {elapsed:6.2f} s, {CHATS * TURNS / elapsed:6.1f} turns/s")
+
+saved = metrics.timings["sales_agent.speculation.saved"]
+print(
+    f"Speculation hit rate: {metrics.hit_rate('sales_agent.speculation'):.0%}, "
+    f"{saved.total / saved.count * 1000:.0f} ms saved per hit"
+)
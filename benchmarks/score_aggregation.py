@@ -0,0 +1,151 @@
+import asyncio
+import os
+import random
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+
+from sqlalchemy import case, create_engine, func, insert, select
+from sqlalchemy.orm import Session
+
+from medrzec_ai.agents.sales.data import InterviewTopic
+from medrzec_ai.database import (
+    Answer,
+    Base,
+    Database,
+    TopicScore,
+    User,
+    points_from_score,
+)
+
+# usage: python -m benchmarks.score_aggregation
+# get_score for users with more and more answers: loading every answer into
+# Python, one grouped SQL aggregate, and the running sums add_answer keeps
+
+HISTORIES = [10, 1000, 10_000, 100_000]
+CALLS = 20
+
+rng = random.Random(0)
+# points_from_score in SQL
+POINTS = case(
+    (Answer.score < -0.6, 1),
+    (Answer.score < -0.2, 2),
+    (Answer.score < 0.2, 3),
+    (Answer.score < 0.6, 4),
+    else_=5,
+)
+
+
+def populate(url: str) -> None:
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        for user_id, answers in enumerate(HISTORIES, start=1):
+            session.add(
+                User(
+                    id=user_id,
+                    email=f"user{user_id}@example.com",
+                    country="PL",
+                    industry="IT",
+                    profession="Manager",
+                )
+            )
+            session.execute(
+                insert(Answer),
+                [
+                    {
+                        "user_id": user_id,
+                        "question": "How do you communicate?",
+                        "response": "Mostly async, in Notion.",
+                        "topic": rng.choice(list(InterviewTopic)),
+                        "score": rng.uniform(-1, 1),
+                        "magnitude": rng.uniform(0, 2),
+                    }
+                    for _ in range(answers)
+                ],
+            )
+
+        session.execute(
+            insert(TopicScore).from_select(
+                ["user_id", "topic", "points", "answers"],
+                select(Answer.user_id, Answer.topic, func.sum(POINTS), func.count())
+                .where(Answer.topic.is_not(None))
+                .group_by(Answer.user_id, Answer.topic),
+            )
+        )
+        session.commit()
+
+    engine.dispose()
+
+
+def score(topics: list[tuple[int, int]]) -> int:
+    return int(sum(p / (n * 5) for p, n in topics) / len(InterviewTopic) * 100)
+
+
+async def python_score(database: Database, user: User) -> int:
+    async with database.sessions() as session:
+        answers = await session.scalars(select(Answer).where(Answer.user_id == user.id))
+        topics: dict[InterviewTopic, list[int]] = {}
+
+        for answer in answers:
+            if answer.topic is not None:
+                topics.setdefault(answer.topic, []).append(
+                    points_from_score(answer.score)
+                )
+
+        return score([(sum(points), len(points)) for points in topics.values()])
+
+
+async def grouped_score(database: Database, user: User) -> int:
+    async with database.sessions() as session:
+        result = await session.execute(
+            select(func.sum(POINTS), func.count())
+            .where(Answer.user_id == user.id)
+            .where(Answer.topic.is_not(None))
+            .group_by(Answer.topic)
+        )
+        return score(list(result.tuples()))
+
+
+async def run(
+    name: str, database: Database, get_score: Callable[[User], Awaitable[int]]
+) -> list[int]:
+    print(f"{name:>8}", end="")
+    scores = []
+
+    for user_id in range(1, len(HISTORIES) + 1):
+        user = User(id=user_id)
+        latencies = []
+
+        for _ in range(CALLS):
+            start = time.perf_counter()
+            result = await get_score(user)
+            latencies.append(time.perf_counter() - start)
+
+        scores.append(result)
+        print(f" {sorted(latencies)[CALLS // 2] * 1000:>9.2f}", end="")
+
+    print()
+    return scores
+
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'db.sqlite')}"
+        populate(url)
+        os.environ["DATABASE_PATH"] = url
+        database = Database()
+
+        print(f"get_score p50 in ms, {CALLS} calls")
+        print(f"{'answers':>8}" + "".join(f" {answers:>9}" for answers in HISTORIES))
+
+        python = await run("python", database, lambda u: python_score(database, u))
+        grouped = await run("grouped", database, lambda u: grouped_score(database, u))
+        running = await run("running", database, database.get_score)
+        assert python == grouped == running
+
+        await database.engine.dispose()
+
+
+asyncio.run(main())
@@ -0,0 +1,142 @@
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from medrzec_ai.database import SQLITE_PRAGMAS
+
+# usage: python -m benchmarks.sqlite_concurrency [directory for the database]
+# chat starts (user and purchase lookups) run during a burst of webhook and
+# answer writes, once with SQLite's defaults and once with SQLITE_PRAGMAS;
+# use a directory on the same kind of disk as production, fsyncs dominate.
+# aiosqlite runs every pooled connection in its own thread, so this does the
+# same with plain sqlite3: through the ORM a small box is CPU-bound long before
+# any lock is contended
+
+USERS = 1000
+PURCHASES = 5000
+READERS = 4
+WRITERS = 2
+SECONDS = 3
+READ_INTERVAL = 0.002
+
+rng = random.Random(0)
+
+
+def populate(path: str) -> None:
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        """
+        CREATE TABLE user (id INTEGER PRIMARY KEY, email TEXT UNIQUE);
+        CREATE TABLE purchase (id INTEGER PRIMARY KEY, user_id INTEGER);
+        CREATE TABLE answer (
+            id INTEGER PRIMARY KEY, user_id INTEGER, response TEXT, score REAL
+        );
+        """
+    )
+    connection.executemany(
+        "INSERT INTO user (email) VALUES (?)",
+        [(f"user{i}@example.com",) for i in range(USERS)],
+    )
+    connection.executemany(
+        "INSERT INTO purchase (user_id) VALUES (?)",
+        [(rng.randrange(1, USERS + 1),) for _ in range(PURCHASES)],
+    )
+    connection.commit()
+    connection.close()
+
+
+def run(name: str, path: str, pragmas: dict[str, object]) -> None:
+    populate(path)
+    reads: list[float] = []
+    writes = 0
+    errors = 0
+    deadline = time.monotonic() + SECONDS
+
+    def connect() -> sqlite3.Connection:
+        connection = sqlite3.connect(path, check_same_thread=False)
+
+        for pragma, value in pragmas.items():
+            connection.execute(f"PRAGMA {pragma} = {value}")
+
+        return connection
+
+    def chat_starts() -> None:
+        nonlocal errors
+        connection = connect()
+
+        while time.monotonic() < deadline:
+            email = f"user{rng.randrange(USERS)}@example.com"
+            start = time.perf_counter()
+
+            try:
+                (user_id,) = connection.execute(
+                    "SELECT id FROM user WHERE email = ?", (email,)
+                ).fetchone()
+                connection.execute(
+                    "SELECT * FROM purchase WHERE user_id = ?", (user_id,)
+                ).fetchall()
+            except sqlite3.OperationalError:  # database is locked
+                errors += 1
+                continue
+
+            reads.append(time.perf_counter() - start)
+            time.sleep(READ_INTERVAL)
+
+        connection.close()
+
+    def webhooks_and_answers() -> None:
+        nonlocal writes, errors
+        connection = connect()
+
+        while time.monotonic() < deadline:
+            user_id = rng.randrange(1, USERS + 1)
+
+            try:
+                if rng.random() < 0.5:
+                    connection.execute(
+                        "INSERT INTO purchase (user_id) VALUES (?)", (user_id,)
+                    )
+                else:
+                    connection.execute(
+                        "INSERT INTO answer (user_id, response, score) "
+                        "VALUES (?, ?, ?)",
+                        (user_id, "Mostly async, in Notion.", rng.uniform(-1, 1)),
+                    )
+                connection.commit()
+            except sqlite3.OperationalError:
+                errors += 1
+                continue
+
+            writes += 1
+
+        connection.close()
+
+    threads = [threading.Thread(target=chat_starts) for _ in range(READERS)]
+    threads += [threading.Thread(target=webhooks_and_answers) for _ in range(WRITERS)]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    reads.sort()
+    print(
+        f"{name:>8} {reads[len(reads) // 2] * 1000:>9.2f} "
+        f"{reads[int(len(reads) * 0.99)] * 1000:>9.2f} {reads[-1] * 1000:>9.1f} "
+        f"{len(reads) / SECONDS:>8.0f} {writes / SECONDS:>9.0f} {errors:>7}"
+    )
+
+
+with tempfile.TemporaryDirectory(dir=sys.argv[1] if len(sys.argv) > 1 else None) as tmp:
+    print(f"{READERS} readers, {WRITERS} writers, {SECONDS}s, times in ms")
+    print(
+        f"{'profile':>8} {'read p50':>9} {'read p99':>9} {'read max':>9} "
+        f"{'reads/s':>8} {'writes/s':>9} {'errors':>7}"
+    )
+
+    run("default", os.path.join(tmp, "default.sqlite"), {})
+    run("tuned", os.path.join(tmp, "tuned.sqlite"), SQLITE_PRAGMAS)
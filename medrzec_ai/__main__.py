@@ -4,7 +4,9 @@ import contextlib
 import hmac
 import os
 import secrets
-from asyncio import Lock
+import signal
+import time
+from collections.abc import Awaitable, Callable
 from typing import Annotated
 from uuid import uuid4
 
@@ -15,34 +17,73 @@ import stripe
 import stripe.error
 from fastapi import FastAPI, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, StreamingResponse
 from pydantic import BaseModel
 
 from medrzec_ai.flows.sales_agent_flow import SalesAgentChat
 
 from . import FlowEnum
+from .conversations import (
+    Conversation,
+    ConversationConflict,
+    ConversationEvicted,
+    ConversationRegistry,
+)
 from .database import Database, User
+from .flows import snapshots
 from .flows.awesome_chat import AwesomeChat
-from .flows.flow import Flow, FlowResponse, FlowSuggestion
+from .flows.flow import FlowResponse, FlowSuggestion
 from .flows.question_and_playbook_chat import QuestionAndPlaybookChat
-from .flows.remote_work_score import TeamRoles
+from .flows.remote_work_score import (
+    AnswerException,
+    Question,
+    TeamRoles,
+    calculate_score,
+    get_questions,
+    validate_answers,
+)
 from .flows.remote_work_score_and_playbook import RemoteWorkScoreAndPlaybookChat
 from .flows.remote_work_score_intro import RemoteWorkScoreIntroChat
-from .utils import api_utils
-from .utils.text_utils import EmojiReplacer, TextFormat
+from .state_store import MemoryStateStore, create_state_store
+from .turns import TurnResults, TurnStatus
+from .utils import api_utils, llm_routes, metrics, streaming
+from .utils.text_utils import EmojiReplacer, TextFormat, remote_work_score_message
 
 dotenv.load_dotenv()
 
-active_conversations: dict[str, tuple[Flow, Lock]] = {}
-
 db = Database()
+conversation_ttl = float(os.getenv("CONVERSATION_TTL_MINUTES", 60)) * 60
+active_conversations = ConversationRegistry(
+    max_conversations=int(os.getenv("MAX_CONVERSATIONS", 500)),
+    max_bytes=int(os.getenv("MAX_CONVERSATIONS_MB", 200)) * 1024 * 1024,
+    idle_ttl=conversation_ttl,
+    db=db,
+    store=create_state_store(os.getenv("CONVERSATION_STORE_URL"), conversation_ttl),
+)
 app = FastAPI()
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"])
 stripe.api_key = os.environ["STRIPE_API_KEY"]
 client = httpx.AsyncClient()
 emoji_replacer = EmojiReplacer()
+snapshot_path = os.getenv("CONVERSATION_SNAPSHOT_PATH") or None
+shutdown_grace_seconds = float(os.getenv("SHUTDOWN_GRACE_SECONDS", 10))
+shutdown_requested_at: float | None = None
+max_batch_respondents = int(os.getenv("MAX_BATCH_RESPONDENTS", 1000))
+turn_result_ttl = float(os.getenv("TURN_RESULT_TTL_SECONDS", 600))
+max_turn_results = int(os.getenv("MAX_TURN_RESULTS", 1000))
+max_turn_wait = float(os.getenv("MAX_TURN_WAIT_SECONDS", 25))
+turn_results = TurnResults(
+    create_state_store(
+        os.getenv("CONVERSATION_STORE_URL"),
+        turn_result_ttl,
+        prefix="turn:",
+        max_entries=max_turn_results,
+    )
+    or MemoryStateStore(turn_result_ttl, max_turn_results)
+)
 
-asyncio.get_event_loop().create_task(emoji_replacer.load_emojis(client))
+if os.getenv("REFRESH_EMOJIS") in ("true", "1"):
+    asyncio.get_event_loop().create_task(emoji_replacer.load_emojis(client))
 
 
 class FlowSuggestionsResponse(BaseModel):
@@ -61,6 +102,47 @@ class SendMessageResponse(BaseModel):
     flow_suggestions: list[FlowSuggestion] | None
 
 
+class TurnError(BaseModel):
+    status: int
+    detail: str
+
+
+class TurnResponse(BaseModel):
+    turn_id: str
+    status: TurnStatus
+    result: SendMessageResponse | None
+    error: TurnError | None
+
+
+class QuestionSchema(BaseModel):
+    question: str
+    # None for questions answered on a 1-5 scale
+    answers: list[str] | None
+    answer_count: int
+
+
+class QuestionnaireResponse(BaseModel):
+    questions: list[QuestionSchema]
+
+
+class ScoreRequest(BaseModel):
+    answers: list[int]
+
+
+class ScoreResponse(BaseModel):
+    score: int
+    message: str
+
+
+class BatchScoreRequest(BaseModel):
+    respondents: list[list[int]]
+
+
+class BatchScoreResponse(BaseModel):
+    results: list[ScoreResponse]
+    average_score: float
+
+
 class AddUserRequest(BaseModel):
     api_key: str
     email: str
@@ -101,30 +183,126 @@ async def start_chat(
     response.response = emoji_replacer.replace_emojis(response.response)
 
     if response.flow_suggestions is None:
-        active_conversations[chat_id] = (chat, asyncio.Lock())
+        active_conversations.add(chat_id, chat)
+        await active_conversations.save(chat_id)
 
     return (chat_id, response)
 
 
 async def user_message(conversation_id: str, message: str) -> FlowResponse:
-    if conversation_id not in active_conversations:
-        raise HTTPException(404, "This chat doesn't exist.")
+    conversation = await get_conversation(conversation_id)
 
-    chat, lock = active_conversations[conversation_id]
-
-    if lock.locked():
+    if conversation.lock.locked():
         raise HTTPException(429, "Please wait for the previous answer.")
 
-    async with lock:
-        response = await chat.submit_message(message)
+    async with conversation.lock:
+        response = await conversation.flow.submit_message(message)
         response.response = list(map(emoji_replacer.replace_emojis, response.response))
 
         if response.flow_suggestions is not None:
-            del active_conversations[conversation_id]
+            await active_conversations.delete(conversation_id)
+        else:
+            # the chat may have been deleted by another request in the meantime
+            with contextlib.suppress(KeyError):
+                await save_conversation(conversation_id)
 
     return response
 
 
+async def save_conversation(chat_id: str) -> None:
+    try:
+        await active_conversations.save(chat_id)
+    except ConversationConflict as e:
+        raise HTTPException(
+            409,
+            "This chat was continued in another window. "
+            "Please reload it and send your message again.",
+        ) from e
+
+
+async def get_conversation(chat_id: str) -> Conversation:
+    try:
+        return await active_conversations.load(chat_id)
+    except ConversationEvicted as e:
+        raise HTTPException(
+            410, "This chat has expired due to inactivity. Please start a new one."
+        ) from e
+    except KeyError as e:
+        raise HTTPException(404, "This chat doesn't exist.") from e
+
+
+@app.on_event("startup")
+async def restore_conversations():
+    install_sigterm_hook()
+
+    if snapshot_path is None or not os.path.exists(snapshot_path):
+        return
+
+    conversations = snapshots.read_snapshot_file(snapshot_path)
+    active_conversations.preload(conversations)
+    os.remove(snapshot_path)
+
+    print(
+        f"Found {len(conversations)} conversation snapshots, "
+        f"{len(active_conversations.pending)} will be restored on first use"
+    )
+
+
+@app.on_event("shutdown")
+async def save_conversations():
+    started_at = shutdown_requested_at or time.monotonic()
+    store = active_conversations.store
+
+    if snapshot_path is None or (store is not None and store.shared):
+        return
+
+    # uvicorn has already drained the connections, this only covers stragglers
+    while active_conversations.busy():
+        if time.monotonic() - started_at > shutdown_grace_seconds:
+            break
+        await asyncio.sleep(0.05)
+
+    conversations = active_conversations.dump()
+    snapshots.write_snapshot_file(snapshot_path, conversations)
+
+    elapsed = time.monotonic() - started_at
+    print(
+        f"Saved {len(conversations)} conversations to {snapshot_path} "
+        f"{elapsed:.2f}s after SIGTERM (grace period {shutdown_grace_seconds:.0f}s)"
+    )
+
+
+@app.on_event("shutdown")
+async def abandon_turns():
+    started_at = shutdown_requested_at or time.monotonic()
+
+    while turn_results.busy():
+        if time.monotonic() - started_at > shutdown_grace_seconds:
+            break
+        await asyncio.sleep(0.05)
+
+    await turn_results.abandon()
+
+
+def install_sigterm_hook() -> None:
+    # runs alongside uvicorn's own handler, only to timestamp the shutdown
+    previous_handler = signal.getsignal(signal.SIGTERM)
+
+    if not callable(previous_handler):
+        return
+
+    def handle_sigterm(signum, frame):
+        global shutdown_requested_at
+
+        if shutdown_requested_at is None:
+            shutdown_requested_at = time.monotonic()
+
+        previous_handler(signum, frame)
+
+    with contextlib.suppress(ValueError):  # not on the main thread
+        signal.signal(signal.SIGTERM, handle_sigterm)
+
+
 @app.get("/", response_class=Response)
 async def index():
     return
@@ -146,68 +324,223 @@ async def start_conversation(
     api_key: str | None = None,
     text_format: TextFormat = TextFormat.MARKDOWN,
 ):
-    if id_token is not None:
-        token_info = await fetch_token(id_token)
-        user = db.get_user(token_info["email"])
-        api_key = None
+    turn = await new_chat(flow, id_token, api_key, text_format)
+    return await turn()
 
-        if os.getenv("ALLOW_ALL_EMAILS") not in ("true", "1") and user is None:
-            raise HTTPException(
-                401,
-                "Your email is not approved yet. "
-                "Contact community@remote-first.institute to get access.",
-            )
 
-    elif api_key is not None:
-        if not check_service_key(api_key):
-            raise HTTPException(401, "Invalid API key.")
-
-        user = None
-        id_token = None
+@app.post("/chats/stream", response_class=StreamingResponse)
+async def start_conversation_stream(
+    flow: FlowEnum,
+    id_token: str | None = None,
+    api_key: str | None = None,
+    text_format: TextFormat = TextFormat.MARKDOWN,
+):
+    return event_stream(await new_chat(flow, id_token, api_key, text_format))
 
-    else:
-        raise HTTPException(401, "Missing credentials.")
 
-    if user is not None:
-        purchases = db.get_purchases(user.id)
-        is_paid = bool(purchases)
-    else:
-        is_paid = False
+async def new_chat(
+    flow: FlowEnum,
+    id_token: str | None,
+    api_key: str | None,
+    text_format: TextFormat,
+) -> Callable[[], Awaitable[StartChatResponse]]:
+    # checks the request up front, so that streams can fail with a status code
+    if shutdown_requested_at is not None:
+        raise HTTPException(503, "The server is restarting, try again in a moment.")
+
+    user = await authenticate(id_token, api_key)
+
+    is_paid = user is not None and await db.is_paid(user.id)
+
+    async def turn() -> StartChatResponse:
+        (chat_id, response) = await start_chat(flow, text_format, user, id_token)
+        return StartChatResponse(
+            chat_id=chat_id,
+            message=emoji_replacer.replace_emojis(response.response),
+            flow_suggestions=response.flow_suggestions,
+            is_paid=is_paid,
+        )
 
-    (chat_id, response) = await start_chat(flow, text_format, user, id_token)
-    return StartChatResponse(
-        chat_id=chat_id,
-        message=emoji_replacer.replace_emojis(response.response),
-        flow_suggestions=response.flow_suggestions,
-        is_paid=is_paid,
-    )
+    return turn
 
 
 @app.delete("/chats/{chat_id}")
 async def delete_conversation(chat_id: str):
-    try:
-        del active_conversations[chat_id]
-    except KeyError as e:
-        raise HTTPException(404, "This chat doesn't exist.") from e
+    await get_conversation(chat_id)
+    await active_conversations.delete(chat_id)
 
 
 @app.post("/chats/{chat_id}/messages", response_model=SendMessageResponse)
 async def send_message(chat_id: str, content: str):
+    turn = await new_message(chat_id, content)
+    return await turn()
+
+
+@app.post("/chats/{chat_id}/messages/stream", response_class=StreamingResponse)
+async def send_message_stream(chat_id: str, content: str):
+    return event_stream(await new_message(chat_id, content))
+
+
+async def new_message(
+    chat_id: str, content: str
+) -> Callable[[], Awaitable[SendMessageResponse]]:
     api_utils.limit_input_len(content)
-    response = await user_message(chat_id, content)
-    return SendMessageResponse(
-        messages=response.response,
-        flow_suggestions=response.flow_suggestions,
+    conversation = await get_conversation(chat_id)
+
+    if conversation.lock.locked():
+        raise HTTPException(429, "Please wait for the previous answer.")
+
+    async def turn() -> SendMessageResponse:
+        response = await user_message(chat_id, content)
+        return SendMessageResponse(
+            messages=response.response,
+            flow_suggestions=response.flow_suggestions,
+        )
+
+    return turn
+
+
+@app.post("/chats/{chat_id}/turns", response_model=TurnResponse, status_code=202)
+async def submit_turn(chat_id: str, content: str, response: Response):
+    if shutdown_requested_at is not None:
+        raise HTTPException(503, "The server is restarting, try again in a moment.")
+
+    turn = await new_message(chat_id, content)
+    turn_id = uuid4().hex
+    await turn_results.submit(f"{chat_id}:{turn_id}", turn)
+
+    response.headers["Location"] = f"/chats/{chat_id}/turns/{turn_id}"
+    return TurnResponse(turn_id=turn_id, status=TurnStatus.PENDING)
+
+
+@app.get("/chats/{chat_id}/turns/{turn_id}", response_model=TurnResponse)
+async def get_turn(chat_id: str, turn_id: str, response: Response, wait: float = 0):
+    record = await turn_results.wait(
+        f"{chat_id}:{turn_id}", max(0, min(wait, max_turn_wait))
+    )
+
+    if record is None:
+        raise HTTPException(404, "This turn doesn't exist or has expired.")
+
+    if record["status"] == TurnStatus.PENDING:
+        response.headers["Retry-After"] = "1"
+
+    return TurnResponse(turn_id=turn_id, **record)
+
+
+def event_stream(turn: Callable[[], Awaitable[BaseModel]]) -> StreamingResponse:
+    return StreamingResponse(
+        streaming.stream_turn(turn, emoji_replacer),
+        media_type="text/event-stream",
+        # keeps proxies from buffering the events
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/questionnaires/{role}", response_model=QuestionnaireResponse)
+async def get_questionnaire(role: str, text_format: TextFormat = TextFormat.MARKDOWN):
+    return QuestionnaireResponse(
+        questions=[
+            QuestionSchema(
+                question=question.question,
+                answers=question.answers,
+                answer_count=question.answer_count,
+            )
+            for question in get_questions(parse_role(role), text_format)
+        ]
     )
 
 
+@app.post("/questionnaires/{role}/responses", response_model=ScoreResponse)
+async def submit_questionnaire(
+    role: str,
+    request: ScoreRequest,
+    id_token: str | None = None,
+    api_key: str | None = None,
+    text_format: TextFormat = TextFormat.MARKDOWN,
+):
+    await authenticate(id_token, api_key)
+    questions = get_questions(parse_role(role), text_format)
+
+    try:
+        return score_questionnaire(questions, request.answers, text_format)
+    except AnswerException as e:
+        raise HTTPException(400, str(e)) from e
+
+
+@app.post("/questionnaires/{role}/responses/batch", response_model=BatchScoreResponse)
+async def submit_questionnaire_batch(
+    role: str,
+    request: BatchScoreRequest,
+    id_token: str | None = None,
+    api_key: str | None = None,
+    text_format: TextFormat = TextFormat.MARKDOWN,
+):
+    await authenticate(id_token, api_key)
+    questions = get_questions(parse_role(role), text_format)
+
+    if not request.respondents:
+        raise HTTPException(400, "At least one respondent is required.")
+
+    if len(request.respondents) > max_batch_respondents:
+        raise HTTPException(
+            400, f"A batch cannot have more than {max_batch_respondents} respondents."
+        )
+
+    results = []
+
+    for number, answers in enumerate(request.respondents, 1):
+        try:
+            results.append(score_questionnaire(questions, answers, text_format))
+        except AnswerException as e:
+            raise HTTPException(400, f"Respondent {number}: {e}") from e
+
+    return BatchScoreResponse(
+        results=results,
+        average_score=sum(result.score for result in results) / len(results),
+    )
+
+
+def parse_role(role: str) -> TeamRoles:
+    try:
+        return TeamRoles[role.upper()]
+    except KeyError as e:
+        raise HTTPException(404, f"Unknown role: {role}.") from e
+
+
+def score_questionnaire(
+    questions: list[Question], answers: list[int], text_format: TextFormat
+) -> ScoreResponse:
+    score = calculate_score(questions, validate_answers(questions, answers))
+    metrics.increment("questionnaires.scored")
+
+    return ScoreResponse(
+        score=score,
+        message=emoji_replacer.replace_emojis(
+            remote_work_score_message(score, text_format)
+        ),
+    )
+
+
+@app.get("/metrics")
+async def get_metrics(api_key: str):
+    if not check_service_key(api_key):
+        raise HTTPException(401, "Invalid API key.")
+
+    return {
+        "conversations": active_conversations.stats(),
+        "llm_routes": llm_routes.latency_report(),
+        **metrics.snapshot(),
+    }
+
+
 @app.post("/users", response_class=Response)
 async def new_user(request: AddUserRequest):
     if not check_service_key(request.api_key):
         raise HTTPException(401, "Invalid API key.")
 
     with contextlib.suppress(sqlalchemy.exc.IntegrityError):
-        db.add_user(
+        await db.add_user(
             User(
                 email=request.email,
                 country=request.country,
@@ -223,7 +556,7 @@ async def delete_user(request: DeleteUserRequest):
         raise HTTPException(401, "Invalid API key.")
 
     with contextlib.suppress(sqlalchemy.exc.IntegrityError):
-        db.delete_user(request.email)
+        await db.delete_user(request.email)
 
 
 @app.get("/checkout-session")
@@ -258,12 +591,12 @@ async def stripe_webhook(request: Request, stripe_signature: Annotated[str, Head
     if event.type != "checkout.session.completed":
         return Response(status_code=204)
 
-    user = db.get_user(event.data.object.customer_details.email)
+    user = await db.get_user(event.data.object.customer_details.email)
 
     if user is None:
         raise HTTPException(404, "User not found.")
 
-    db.add_purchase(user.id)
+    await db.add_purchase(user.id)
 
     return Response(status_code=204)
 
@@ -289,6 +622,29 @@ async def slack(code: str):
     return f"Authorized with the {json['team']['name']} workspace."
 
 
+async def authenticate(id_token: str | None, api_key: str | None) -> User | None:
+    if id_token is not None:
+        token_info = await fetch_token(id_token)
+        user = await db.get_user(token_info["email"])
+
+        if os.getenv("ALLOW_ALL_EMAILS") not in ("true", "1") and user is None:
+            raise HTTPException(
+                401,
+                "Your email is not approved yet. "
+                "Contact community@remote-first.institute to get access.",
+            )
+
+        return user
+
+    if api_key is not None:
+        if not check_service_key(api_key):
+            raise HTTPException(401, "Invalid API key.")
+
+        return None
+
+    raise HTTPException(401, "Missing credentials.")
+
+
 async def fetch_token(id_token: str) -> dict:
     response = await client.get(
         "https://oauth2.googleapis.com/tokeninfo", params={"id_token": id_token}
@@ -1,13 +1,18 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import re
+import time
 from dataclasses import dataclass, field
+from typing import Any
 
 from langchain import PromptTemplate
 from langchain.chains import LLMChain
 from langchain.llms import BaseLLM
 from langchain.schema import BaseLLMOutputParser, Generation
 
+from ...utils import metrics
 from .data import CONVERSATION_PROMPT, CONVERSATION_STAGES, STAGE_ANALYZER_PROMPT
 
 MESSAGES_HARD_LIMIT = 100
@@ -19,43 +24,124 @@ class Agent:
     conversation_chain: ConversationChain
     conversation_history: list[str] = field(default_factory=list)
     current_stage: int = 0
+    # generate the reply for the current stage while the stage is being analyzed
+    speculative: bool = False
+
+    def get_state(self) -> dict[str, Any]:
+        return {
+            "conversation_history": self.conversation_history,
+            "current_stage": self.current_stage,
+        }
+
+    def load_state(self, state: dict[str, Any]) -> None:
+        self.conversation_history = state["conversation_history"]
+        self.current_stage = state["current_stage"]
 
     def step(self, user_message: str) -> str:
-        self.conversation_history.append(f"User: {user_message}")
-        self.conversation_history = self.conversation_history[-20:]
+        self.add_user_message(user_message)
 
         if len(self.conversation_history) >= MESSAGES_HARD_LIMIT:
             self.current_stage = len(CONVERSATION_STAGES) - 1
         else:
             self.current_stage = int(
-                self.stage_analyzer_chain(
-                    {
-                        "conversation_history": "\n".join(self.conversation_history),
-                        "conversation_stages": "\n-------\n".join(
-                            f"{i}: {stage.title}:\n{stage.prompt}"
-                            for i, stage in list(enumerate(CONVERSATION_STAGES))[
-                                self.current_stage : self.current_stage + 1
-                            ]
-                        ),
-                        "conversation_stage_id": self.current_stage or "(none)",
-                    }
-                )["text"]
+                self.stage_analyzer_chain(self.stage_analyzer_inputs())["text"]
             )
 
-        current_conversation_stage = CONVERSATION_STAGES[self.current_stage]
+        ai_message = self.conversation_chain(self.conversation_inputs())["text"]
+        return self.add_ai_message(ai_message)
+
+    async def astep(self, user_message: str) -> str:
+        self.add_user_message(user_message)
+
+        if len(self.conversation_history) >= MESSAGES_HARD_LIMIT:
+            self.current_stage = len(CONVERSATION_STAGES) - 1
+        elif self.speculative:
+            return self.add_ai_message(await self.speculative_step())
+        else:
+            stage = await self.stage_analyzer_chain.acall(self.stage_analyzer_inputs())
+            self.current_stage = int(stage["text"])
+
+        reply = await self.conversation_chain.acall(self.conversation_inputs())
+        return self.add_ai_message(reply["text"])
+
+    async def speculative_step(self) -> str:
+        previous_stage = self.current_stage
+        analysis = asyncio.create_task(
+            timed_call(self.stage_analyzer_chain, self.stage_analyzer_inputs())
+        )
+        speculation = asyncio.create_task(
+            timed_call(self.conversation_chain, self.conversation_inputs())
+        )
 
-        ai_message = self.conversation_chain(
-            {
-                "current_conversation_stage": f"{current_conversation_stage.title}\n{current_conversation_stage.prompt}\n---",
-                "conversation_history": "\n".join(self.conversation_history),
-            }
-        )["text"]
+        try:
+            stage, analysis_time = await analysis
+            self.current_stage = int(stage["text"])
+        except BaseException:
+            await cancel(speculation)
+            raise
+
+        if self.current_stage != previous_stage:
+            await cancel(speculation)
+            metrics.miss("sales_agent.speculation")
+            reply = await self.conversation_chain.acall(self.conversation_inputs())
+            return reply["text"]
+
+        reply, reply_time = await speculation
+        metrics.hit("sales_agent.speculation")
+        # running both in sequence would have taken the sum of the two
+        metrics.record_time(
+            "sales_agent.speculation.saved", min(analysis_time, reply_time)
+        )
+        return reply["text"]
+
+    def add_user_message(self, user_message: str) -> None:
+        self.conversation_history.append(f"User: {user_message}")
+        self.conversation_history = self.conversation_history[-20:]
+
+    def add_ai_message(self, ai_message: str) -> str:
         self.conversation_history.append(f"AI: {ai_message}")
 
         print(f"Current stage: {self.current_stage}")
 
         return ai_message
 
+    def stage_analyzer_inputs(self) -> dict[str, Any]:
+        return {
+            "conversation_history": "\n".join(self.conversation_history),
+            "conversation_stages": "\n-------\n".join(
+                f"{i}: {stage.title}:\n{stage.prompt}"
+                for i, stage in list(enumerate(CONVERSATION_STAGES))[
+                    self.current_stage : self.current_stage + 1
+                ]
+            ),
+            "conversation_stage_id": self.current_stage or "(none)",
+        }
+
+    def conversation_inputs(self) -> dict[str, Any]:
+        current_conversation_stage = CONVERSATION_STAGES[self.current_stage]
+
+        return {
+            "current_conversation_stage": f"{current_conversation_stage.title}\n{current_conversation_stage.prompt}\n---",
+            "conversation_history": "\n".join(self.conversation_history),
+        }
+
+
+async def timed_call(
+    chain: LLMChain, inputs: dict[str, Any]
+) -> tuple[dict[str, Any], float]:
+    start = time.perf_counter()
+    outputs = await chain.acall(inputs)
+    return (outputs, time.perf_counter() - start)
+
+
+async def cancel(task: asyncio.Task) -> None:
+    # waits for it, so that the LLM call doesn't outlive the turn
+    task.cancel()
+
+    # it may also have failed already, which no longer matters
+    with contextlib.suppress(asyncio.CancelledError, Exception):
+        await task
+
 
 class StageAnalyzerChain(LLMChain):
     @classmethod
@@ -0,0 +1,23 @@
+"""add lookup indexes
+
+Revision ID: b6f70908039c
+Revises: ef0383042a6d
+Create Date: 2026-10-18 12:04:51.208113
+
+"""
+from alembic import op
+
+revision = "b6f70908039c"
+down_revision = "ef0383042a6d"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_purchase_user_id", "purchase", ["user_id"])
+    op.create_index("ix_answer_user_id_topic", "answer", ["user_id", "topic"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_answer_user_id_topic", table_name="answer")
+    op.drop_index("ix_purchase_user_id", table_name="purchase")
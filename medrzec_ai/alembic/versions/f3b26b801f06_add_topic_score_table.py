@@ -0,0 +1,62 @@
+"""add topic_score table
+
+Revision ID: f3b26b801f06
+Revises: b6f70908039c
+Create Date: 2026-10-18 13:21:07.634982
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "f3b26b801f06"
+down_revision = "b6f70908039c"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "topic_score",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("user.id"), nullable=False),
+        sa.Column(
+            "topic",
+            sa.Enum(
+                "ORGANIZATION",
+                "COMMUNICATION",
+                "LEADERSHIP",
+                "CULTURE_AND_VALUES",
+                "WELLBEING",
+                name="interviewtopic",
+            ),
+            nullable=False,
+        ),
+        sa.Column("points", sa.Integer(), nullable=False),
+        sa.Column("answers", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("user_id", "topic"),
+    )
+    # the sums for answers given so far, points as in points_from_score
+    op.execute(
+        """
+        INSERT INTO topic_score (user_id, topic, points, answers)
+        SELECT
+            user_id,
+            topic,
+            SUM(
+                CASE
+                    WHEN score < -0.6 THEN 1
+                    WHEN score < -0.2 THEN 2
+                    WHEN score < 0.2 THEN 3
+                    WHEN score < 0.6 THEN 4
+                    ELSE 5
+                END
+            ),
+            COUNT(*)
+        FROM answer
+        WHERE topic IS NOT NULL
+        GROUP BY user_id, topic
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("topic_score")
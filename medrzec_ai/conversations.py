@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import contextlib
+import dataclasses
+import time
+from asyncio import Lock
+from collections import OrderedDict
+
+from .database import Database
+from .flows import snapshots
+from .flows.flow import Flow
+from .state_store import StateStore
+from .utils import metrics
+
+MAX_TOMBSTONES = 10_000
+# by the flow a chat is currently in: the heap it holds before any history and
+# per byte of serialized history. The LLM clients, chains and retriever are
+# shared and not included. Measured with python -m benchmarks.conversation_memory
+FLOW_COSTS = {
+    "PlaybookChat": (18_000, 3),
+    "QuestionChat": (7_000, 6),
+    "RemoteWorkScoreChat": (25_000, 4),
+    "SalesAgentChat": (9_500, 4),
+}
+DEFAULT_FLOW_COST = (25_000, 6)
+
+
+class ConversationEvicted(KeyError):
+    pass
+
+
+class ConversationConflict(Exception):
+    # another replica saved a turn of the same chat first
+    pass
+
+
+@dataclasses.dataclass
+class Conversation:
+    flow: Flow
+    lock: Lock
+    size: int = 0
+    version: int = 0
+    # the snapshot in the store this copy is based on, None for new chats
+    stored: bytes | None = None
+    last_used: float = dataclasses.field(default_factory=time.monotonic)
+
+
+class ConversationRegistry:
+    def __init__(
+        self,
+        max_conversations: int,
+        max_bytes: int,
+        idle_ttl: float,
+        db: Database,
+        store: StateStore | None = None,
+    ) -> None:
+        self.max_conversations = max_conversations
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.conversations: OrderedDict[str, Conversation] = OrderedDict()
+        self.total_bytes = 0
+        # ids of evicted chats, so that they can be told apart from unknown ones
+        self.tombstones: OrderedDict[str, None] = OrderedDict()
+        self.db = db
+        self.store = store
+        # snapshots left behind by a previous pod, restored on first use
+        self.pending: dict[str, tuple[float, bytes]] = {}
+
+    def __contains__(self, chat_id: str) -> bool:
+        self.expire()
+        return chat_id in self.conversations
+
+    def __len__(self) -> int:
+        return len(self.conversations)
+
+    def add(self, chat_id: str, flow: Flow) -> Conversation:
+        conversation = Conversation(flow, Lock())
+        self.conversations[chat_id] = conversation
+        self.expire()
+        self.shrink()
+        return conversation
+
+    def get(self, chat_id: str) -> Conversation:
+        self.expire()
+
+        if (conversation := self.conversations.get(chat_id)) is None:
+            if chat_id in self.tombstones:
+                raise ConversationEvicted(chat_id)
+            raise KeyError(chat_id)
+
+        conversation.last_used = time.monotonic()
+        self.conversations.move_to_end(chat_id)
+        return conversation
+
+    def remove(self, chat_id: str) -> None:
+        if (conversation := self.conversations.pop(chat_id, None)) is None:
+            if chat_id in self.tombstones:
+                raise ConversationEvicted(chat_id)
+            raise KeyError(chat_id)
+
+        self.total_bytes -= conversation.size
+
+    async def load(self, chat_id: str) -> Conversation:
+        if (pending := self.pending.pop(chat_id, None)) is not None:
+            last_used, data = pending
+
+            if last_used > time.monotonic() - self.idle_ttl:
+                conversation = self.restore(chat_id, data)
+                conversation.last_used = last_used
+
+                if self.store is not None:
+                    await self.store.set(chat_id, data)
+                    conversation.stored = data
+            else:
+                self.tombstones[chat_id] = None
+
+        if self.store is None:
+            return self.get(chat_id)
+
+        conversation = self.conversations.get(chat_id)
+
+        if conversation is not None and conversation.lock.locked():
+            return self.get(chat_id)
+
+        if (data := await self.store.get(chat_id)) is None:
+            # deleted or finished on another replica
+            if chat_id in self.conversations:
+                self.remove(chat_id)
+            return self.get(chat_id)
+
+        conversation = self.conversations.get(chat_id)
+
+        if conversation is None or conversation.stored != data:
+            if conversation is not None:
+                self.remove(chat_id)
+
+            self.restore(chat_id, data).stored = data
+
+        return self.get(chat_id)
+
+    def restore(self, chat_id: str, data: bytes) -> Conversation:
+        version, snapshot = snapshots.load_snapshot(data)
+
+        with metrics.timed("conversations.restore"):
+            flow = snapshots.restore_flow(snapshot, self.db)
+
+        conversation = self.add(chat_id, flow)
+        conversation.version = version
+        state = snapshots.encode_flow(flow, version)
+        self.resize(chat_id, estimate_size(flow, len(state)))
+        return conversation
+
+    async def save(self, chat_id: str) -> None:
+        conversation = self.conversations[chat_id]
+        conversation.version += 1
+
+        with metrics.timed("conversations.snapshot"):
+            state = snapshots.encode_flow(conversation.flow, conversation.version)
+            data = snapshots.compress_snapshot(state)
+
+        if self.store is not None:
+            if not await self.store.compare_and_set(chat_id, data, conversation.stored):
+                # this copy is stale, the next request loads the other turn
+                self.remove(chat_id)
+                metrics.increment("conversations.conflicts")
+                raise ConversationConflict(chat_id)
+
+            conversation.stored = data
+
+        self.resize(chat_id, estimate_size(conversation.flow, len(state)))
+
+    async def delete(self, chat_id: str) -> None:
+        self.pending.pop(chat_id, None)
+
+        with contextlib.suppress(KeyError):
+            self.remove(chat_id)
+
+        if self.store is not None:
+            await self.store.delete(chat_id)
+
+    def dump(self) -> dict[str, tuple[float, bytes]]:
+        now = time.monotonic()
+        dumped = {
+            chat_id: (now - last_used, data)
+            for chat_id, (last_used, data) in self.pending.items()
+        }
+
+        for chat_id, conversation in self.conversations.items():
+            if conversation.lock.locked():
+                print(f"Skipping snapshot of chat {chat_id}, it's still mid-turn")
+                continue
+
+            data = snapshots.dump_flow(conversation.flow, conversation.version)
+            dumped[chat_id] = (now - conversation.last_used, data)
+
+        return dumped
+
+    def preload(self, conversations: dict[str, tuple[float, bytes]]) -> None:
+        now = time.monotonic()
+
+        for chat_id, (idle, data) in conversations.items():
+            if idle < self.idle_ttl:
+                self.pending[chat_id] = (now - idle, data)
+
+    def busy(self) -> bool:
+        return any(
+            conversation.lock.locked() for conversation in self.conversations.values()
+        )
+
+    def resize(self, chat_id: str, size: int) -> None:
+        conversation = self.conversations[chat_id]
+        self.total_bytes += size - conversation.size
+        conversation.size = size
+        self.shrink()
+
+    def expire(self) -> None:
+        deadline = time.monotonic() - self.idle_ttl
+
+        # least recently used first, so the scan stops at the first fresh chat
+        for chat_id, conversation in list(self.conversations.items()):
+            if conversation.last_used > deadline:
+                break
+            if not conversation.lock.locked():
+                self.evict(chat_id, "ttl")
+
+    def shrink(self) -> None:
+        for chat_id, conversation in list(self.conversations.items()):
+            if len(self.conversations) > self.max_conversations:
+                reason = "count"
+            elif self.total_bytes > self.max_bytes:
+                reason = "bytes"
+            else:
+                break
+
+            if not conversation.lock.locked():
+                self.evict(chat_id, reason)
+
+    def evict(self, chat_id: str, reason: str) -> None:
+        self.remove(chat_id)
+        self.tombstones[chat_id] = None
+        if len(self.tombstones) > MAX_TOMBSTONES:
+            self.tombstones.popitem(last=False)
+
+        metrics.increment(f"conversations.evicted.{reason}")
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "active": len(self.conversations),
+            "pending_restore": len(self.pending),
+            "estimated_bytes": self.total_bytes,
+            "max_conversations": self.max_conversations,
+            "max_bytes": self.max_bytes,
+        }
+
+
+def estimate_size(flow: Flow, state_bytes: int) -> int:
+    # the questionnaire and playbook wrappers cost little besides their flow
+    while isinstance(inner := getattr(flow, "flow", None), Flow):
+        flow = inner
+
+    base, per_byte = FLOW_COSTS.get(type(flow).__name__, DEFAULT_FLOW_COST)
+    return base + state_bytes * per_byte
@@ -1,14 +1,43 @@
 from __future__ import annotations
 
 import os
+import time
+from collections import OrderedDict
 from datetime import datetime
-from typing import Sequence
-
-from sqlalchemy import ForeignKey, create_engine, delete, select
-from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column
+from typing import Any, Sequence
+
+from sqlalchemy import ForeignKey, Index, delete, event, exists, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.sql import func
 
 from medrzec_ai.agents.sales.data import InterviewTopic
+from medrzec_ai.utils import metrics
+
+# async drivers for the dialects DATABASE_PATH may point at
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+# INSERT ... ON CONFLICT DO UPDATE for add_answer's running sums
+UPSERT_DIALECTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+# applied to every connection to a SQLite file unless SQLITE_TUNING=false
+SQLITE_PRAGMAS = {
+    # readers keep reading the last commit while a write is in progress
+    "journal_mode": "WAL",
+    # durable in WAL mode except for the last commits on power loss
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "mmap_size": 256 * 1024 * 1024,
+}
+SQLITE_ENGINE_OPTIONS = {
+    # long-lived connections, so the pragmas and statement caches are reused;
+    # explicit, since some 2.0 releases default aiosqlite files to NullPool
+    "poolclass": AsyncAdaptedQueuePool,
+    "pool_size": 8,
+    "max_overflow": 0,
+    "connect_args": {"cached_statements": 256},
+}
 
 
 class Base(DeclarativeBase):
@@ -40,6 +69,8 @@ class RemoteWorkScore(Base):
 
 class Answer(Base):
     __tablename__ = "answer"
+    # a user's answers, grouped by topic for the score
+    __table_args__ = (Index("ix_answer_user_id_topic", "user_id", "topic"),)
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("user.id"), nullable=False)
     question: Mapped[str] = mapped_column(nullable=False)
@@ -49,105 +80,190 @@ class Answer(Base):
     magnitude: Mapped[float] = mapped_column(nullable=False)
 
 
+class TopicScore(Base):
+    # running sums of points_from_score, kept up to date by add_answer
+    __tablename__ = "topic_score"
+    user_id: Mapped[int] = mapped_column(ForeignKey("user.id"), primary_key=True)
+    topic: Mapped[InterviewTopic] = mapped_column(primary_key=True)
+    points: Mapped[int] = mapped_column(nullable=False)
+    answers: Mapped[int] = mapped_column(nullable=False)
+
+
 class Purchase(Base):
     __tablename__ = "purchase"
     id: Mapped[int] = mapped_column(primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("user.id"), nullable=False)
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("user.id"), nullable=False, index=True
+    )
     created_at: Mapped[datetime] = mapped_column(
         server_default=func.now(), nullable=False
     )
 
 
+class PaidStatusCache:
+    # purchases are never removed, so paid users stay paid; "not paid" expires,
+    # since the webhook may have been handled by another replica
+    def __init__(self, unpaid_ttl: float, max_entries: int) -> None:
+        self.unpaid_ttl = unpaid_ttl
+        self.max_entries = max_entries
+        # user id -> (paid, expiry)
+        self.entries: OrderedDict[int, tuple[bool, float]] = OrderedDict()
+
+    def get(self, user_id: int) -> bool | None:
+        if (entry := self.entries.get(user_id)) is None:
+            return None
+
+        paid, expires = entry
+
+        if expires < time.monotonic():
+            del self.entries[user_id]
+            return None
+
+        return paid
+
+    def put(self, user_id: int, paid: bool) -> None:
+        # a lookup that started before add_purchase must not undo it
+        if not paid and self.entries.get(user_id, (False, 0))[0]:
+            return
+
+        expires = float("inf") if paid else time.monotonic() + self.unpaid_ttl
+        self.entries[user_id] = (paid, expires)
+        self.entries.move_to_end(user_id)
+
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
 class Database:
     def __init__(self) -> None:
-        self.engine = create_engine(os.environ["DATABASE_PATH"])
-
-    def add_user(self, user: User):
-        with Session(self.engine) as session:
+        url = async_url(os.environ["DATABASE_PATH"])
+        tuned = os.getenv("SQLITE_TUNING", "true") in ("true", "1")
+
+        if tuned and is_sqlite_file(url):
+            self.engine = create_async_engine(url, **SQLITE_ENGINE_OPTIONS)
+            event.listen(self.engine.sync_engine, "connect", set_sqlite_pragmas)
+        else:
+            self.engine = create_async_engine(url)
+
+        # returned objects stay usable after their session is closed
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.paid_status = PaidStatusCache(
+            float(os.getenv("UNPAID_STATUS_TTL_SECONDS", 30)),
+            int(os.getenv("MAX_PAID_STATUS_ENTRIES", 10000)),
+        )
+
+    async def add_user(self, user: User):
+        async with self.sessions() as session:
             session.add(user)
-            session.commit()
+            await session.commit()
 
-    def get_user(self, email: str) -> User | None:
-        with Session(self.engine) as session:
-            return session.scalars(select(User).where(User.email == email)).first()
+    async def get_user(self, email: str) -> User | None:
+        async with self.sessions() as session:
+            result = await session.scalars(select(User).where(User.email == email))
+            return result.first()
 
-    def delete_user(self, email: str):
-        with Session(self.engine) as session:
-            session.execute(delete(User).where(User.email == email))
+    async def delete_user(self, email: str):
+        async with self.sessions() as session:
+            await session.execute(delete(User).where(User.email == email))
+            await session.commit()
 
-    def add_answer(self, answer: Answer):
-        with Session(self.engine) as session:
+    async def add_answer(self, answer: Answer):
+        async with self.sessions() as session:
             session.add(answer)
-            session.commit()
 
-    def add_purchase(self, user_id: int):
-        with Session(self.engine) as session:
+            if answer.topic is not None:
+                # one statement, so concurrent first answers can't both insert
+                insert = UPSERT_DIALECTS[self.engine.dialect.name]
+                statement = insert(TopicScore).values(
+                    user_id=answer.user_id,
+                    topic=answer.topic,
+                    points=points_from_score(answer.score),
+                    answers=1,
+                )
+                await session.execute(
+                    statement.on_conflict_do_update(
+                        index_elements=[TopicScore.user_id, TopicScore.topic],
+                        set_={
+                            "points": TopicScore.points + statement.excluded.points,
+                            "answers": TopicScore.answers + 1,
+                        },
+                    )
+                )
+
+            await session.commit()
+
+    async def add_purchase(self, user_id: int):
+        async with self.sessions() as session:
             session.add(Purchase(user_id=user_id))
-            session.commit()
+            await session.commit()
 
-    def get_purchases(self, user_id: int) -> Sequence[Purchase]:
-        with Session(self.engine) as session:
-            return session.scalars(
+        self.paid_status.put(user_id, True)
+
+    async def get_purchases(self, user_id: int) -> Sequence[Purchase]:
+        async with self.sessions() as session:
+            result = await session.scalars(
                 select(Purchase).where(Purchase.user_id == user_id)
-            ).all()
-
-    def get_score(self, user: User) -> int:
-        with Session(self.engine) as session:
-            elo = session.scalars(
-                select(Answer)
-                .where(Answer.user_id == user.id)
-                .where(Answer.topic is not None)
-                .group_by(Answer.topic)
-            ).all()
-
-            organization = [x for x in elo if x.topic is InterviewTopic.ORGANIZATION]
-            comunication = [x for x in elo if x.topic is InterviewTopic.COMMUNICATION]
-            leadership = [x for x in elo if x.topic is InterviewTopic.LEADERSHIP]
-            culture = [x for x in elo if x.topic is InterviewTopic.CULTURE_AND_VALUES]
-            welbeing = [x for x in elo if x.topic is InterviewTopic.WELLBEING]
-
-            organizationScore = sum(
-                map(lambda x: points_from_score(x.score), organization)
-            ) / ((len(organization)) * 5)
-
-            comunicationScore = sum(
-                map(lambda x: points_from_score(x.score), comunication)
-            ) / ((len(comunication)) * 5)
-
-            leadershipScore = sum(
-                map(lambda x: points_from_score(x.score), leadership)
-            ) / ((len(leadership)) * 5)
-
-            if not welbeing:
-                welbeingScore = 0
-            else:
-                welbeingScore = sum(
-                    map(lambda x: points_from_score(x.score), welbeing)
-                ) / ((len(welbeing)) * 5)
-
-            if not culture:
-                cultureScore = 0
-            else:
-                cultureScore = sum(
-                    map(lambda x: points_from_score(x.score), cultureScore)
-                ) / ((len(culture)) * 5)
-
-            score = (
-                (
-                    organizationScore
-                    + comunicationScore
-                    + leadershipScore
-                    + welbeingScore
-                    + cultureScore
+            )
+            return result.all()
+
+    async def is_paid(self, user_id: int) -> bool:
+        if (paid := self.paid_status.get(user_id)) is not None:
+            metrics.hit("paid_status")
+            return paid
+
+        metrics.miss("paid_status")
+
+        async with self.sessions() as session:
+            paid = bool(
+                await session.scalar(
+                    select(exists().where(Purchase.user_id == user_id))
                 )
-                / 5
-                * 100
             )
 
-            return int(score)
+        self.paid_status.put(user_id, paid)
+        return paid
+
+    async def get_score(self, user: User) -> int:
+        async with self.sessions() as session:
+            result = await session.execute(
+                select(TopicScore.points, TopicScore.answers).where(
+                    TopicScore.user_id == user.id
+                )
+            )
+            # the average of the topics' scores, unanswered topics count as 0
+            topics = sum(points / (answers * 5) for points, answers in result)
+            return int(topics / len(InterviewTopic) * 100)
+
+
+def async_url(url: str) -> str:
+    # DATABASE_PATH is shared with alembic, which needs the sync driver
+    parsed = make_url(url)
+
+    if "+" in parsed.drivername or parsed.drivername not in ASYNC_DRIVERS:
+        return url
+
+    driver = ASYNC_DRIVERS[parsed.drivername]
+    return parsed.set(drivername=f"{parsed.drivername}+{driver}").render_as_string(
+        hide_password=False
+    )
+
+
+def is_sqlite_file(url: str) -> bool:
+    parsed = make_url(url)
+    in_memory = parsed.database in (None, "", ":memory:")
+    return parsed.get_backend_name() == "sqlite" and not in_memory
+
+
+def set_sqlite_pragmas(connection: Any, _: Any) -> None:
+    cursor = connection.cursor()
+
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+
+    cursor.close()
 
 
-def points_from_score(score: float):
+def points_from_score(score: float) -> int:
     if score < -0.6:
         return 1
     if score < -0.2:
@@ -0,0 +1,88 @@
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .utils import metrics
+
+
+class EmbeddingCache:
+    def __init__(self, path: str | None, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self.memory: OrderedDict[str, list[float]] = OrderedDict()
+        # the memory tier is only used from the event loop, the connection is
+        # shared by worker threads
+        self.lock = threading.Lock()
+        self.db: sqlite3.Connection | None = None
+
+        if path is not None:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, embedding BLOB NOT NULL)"
+            )
+            self.db.commit()
+
+    async def get(self, model: str, text: str) -> list[float] | None:
+        key = cache_key(model, text)
+
+        if (embedding := self.memory.get(key)) is not None:
+            self.memory.move_to_end(key)
+            return embedding
+
+        if self.db is None:
+            return None
+
+        # SQLite reads the disk, so it runs off the event loop
+        if (blob := await asyncio.to_thread(self.read, key)) is None:
+            return None
+
+        metrics.increment("embedding_cache.disk_hits")
+        embedding = np.frombuffer(blob, dtype=np.float32).tolist()
+        self.remember(key, embedding)
+        return embedding
+
+    async def put(self, model: str, text: str, embedding: list[float]) -> None:
+        key = cache_key(model, text)
+        self.remember(key, embedding)
+
+        if self.db is not None:
+            blob = np.asarray(embedding, dtype=np.float32).tobytes()
+            await asyncio.to_thread(self.write, key, blob)
+
+    def read(self, key: str) -> bytes | None:
+        assert self.db is not None
+
+        with self.lock:
+            row = self.db.execute(
+                "SELECT embedding FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+
+        return None if row is None else row[0]
+
+    def write(self, key: str, blob: bytes) -> None:
+        assert self.db is not None
+
+        # the commit waits for the disk
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?)", (key, blob)
+            )
+            self.db.commit()
+
+    def remember(self, key: str, embedding: list[float]) -> None:
+        self.memory[key] = embedding
+        self.memory.move_to_end(key)
+
+        if len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+
+def cache_key(model: str, text: str) -> str:
+    return f"{model}:{normalize_query(text)}"
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.lower().split()).strip(" .?!\"'")
@@ -1,12 +1,11 @@
-from langchain.chat_models import ChatOpenAI
-
 from .. import FlowEnum
+from ..utils import llm_routes
 from .flow import Flow, FlowResponse
 
 
 class AwesomeChat(Flow):
     def __init__(self) -> None:
-        self.llm = ChatOpenAI(temperature=1, model="gpt-4", client=None)
+        self.llm = llm_routes.chat_llm("awesome")
 
     async def start_conversation(self) -> FlowResponse[str]:
         response = await self.llm.apredict(
@@ -2,11 +2,17 @@ from __future__ import annotations
 
 import dataclasses
 from abc import ABC, abstractmethod
-from typing import Any, Generic, TypeVar
+from typing import TYPE_CHECKING, Any, Generic, TypeVar
+
+from langchain.schema import AIMessage, BaseMessage, HumanMessage
 
 from .. import FlowSuggestion
 
+if TYPE_CHECKING:
+    from ..database import Database
+
 T = TypeVar("T")
+FlowT = TypeVar("FlowT", bound="Flow")
 
 
 class Flow(ABC):
@@ -18,9 +24,29 @@ class Flow(ABC):
     async def submit_message(self, text: str) -> FlowResponse[list[str]]:
         ...
 
+    def get_state(self) -> dict[str, Any]:
+        raise NotImplementedError()
+
+    @classmethod
+    def from_state(cls: type[FlowT], state: dict[str, Any], db: Database) -> FlowT:
+        raise NotImplementedError()
+
 
 @dataclasses.dataclass
 class FlowResponse(Generic[T]):
     response: T
     flow_suggestions: list[FlowSuggestion] | None = None
     extra: dict[str, Any] = dataclasses.field(default_factory=dict)
+
+
+def dump_messages(messages: list[BaseMessage]) -> list[list[str]]:
+    return [[message.type, str(message.content)] for message in messages]
+
+
+def load_messages(messages: list[list[str]]) -> list[BaseMessage]:
+    return [
+        HumanMessage(content=content)
+        if type_ == "human"
+        else AIMessage(content=content)
+        for type_, content in messages
+    ]
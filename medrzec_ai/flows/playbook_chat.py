@@ -1,30 +1,26 @@
+import asyncio
 import os
+from typing import Any
 
-import pinecone
 from langchain.agents import AgentType, initialize_agent
-from langchain.chat_models import ChatOpenAI
-from langchain.embeddings.openai import OpenAIEmbeddings
 from langchain.memory import ConversationBufferMemory
 from langchain.schema.output_parser import OutputParserException
 from langchain.tools import Tool
-from langchain.vectorstores import Pinecone
 
-from .flow import Flow, FlowResponse
+from ..database import Database
+from ..retrieval import playbook_retriever
+from ..utils import llm_routes, metrics
+from .flow import Flow, FlowResponse, dump_messages, load_messages
 
 
 class PlaybookChat(Flow):
-    def __init__(self, user_score: int) -> None:
+    # the score is only needed by start_conversation, so that the slow setup
+    # can happen before the questionnaire is finished
+    def __init__(self, user_score: int | None = None) -> None:
         self.user_score = user_score
 
-        pinecone.init(
-            os.environ["PINECONE_API_KEY"], environment=os.environ["PINECONE_ENV"]
-        )
-        self.docsearch = Pinecone.from_existing_index(
-            "playbook", OpenAIEmbeddings(client=None)
-        )
-
         async def query_playbook(query: str) -> str:
-            return "\n".join(self.get_relevant_fragments(query))
+            return "\n".join(await self.get_relevant_fragments(query))
 
         tools = [
             Tool(
@@ -35,18 +31,32 @@ class PlaybookChat(Flow):
             )
         ]
 
-        memory = ConversationBufferMemory(
+        self.memory = ConversationBufferMemory(
             memory_key="chat_history", return_messages=True
         )
 
         self.agent = initialize_agent(
             tools,
-            ChatOpenAI(temperature=0.9, model="gpt-4", client=None),
+            llm_routes.chat_llm("playbook"),
             AgentType.CHAT_CONVERSATIONAL_REACT_DESCRIPTION,
-            memory=memory,
+            memory=self.memory,
         )
 
+    def get_state(self) -> dict[str, Any]:
+        return {
+            "user_score": self.user_score,
+            "messages": dump_messages(self.memory.chat_memory.messages),
+        }
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any], db: Database) -> "PlaybookChat":
+        chat = cls(state["user_score"])
+        chat.memory.chat_memory.messages.extend(load_messages(state["messages"]))
+        return chat
+
     async def start_conversation(self) -> FlowResponse[str]:
+        assert self.user_score is not None
+
         for _ in range(5):
             try:
                 response = await self.agent.arun(
@@ -85,6 +95,75 @@ Format your responses with Markdown and add emojis. During the conversation, alw
         response = await self.agent.arun(input=text)
         return FlowResponse([response])
 
-    def get_relevant_fragments(self, query: str) -> list[str]:
-        docs = self.docsearch.similarity_search(query)
-        return [doc.page_content for doc in docs]
+    async def get_relevant_fragments(self, query: str) -> list[str]:
+        return await playbook_retriever.search(query)
+
+
+class PlaybookWarmer:
+    def __init__(self) -> None:
+        self.enabled = os.getenv("PREWARM_PLAYBOOK", "true") in ("true", "1")
+        self.setup: asyncio.Future[PlaybookChat] | None = None
+        self.intro: asyncio.Task[tuple[PlaybookChat, str]] | None = None
+        self.warm: bool | None = None
+
+    def prepare(self) -> None:
+        if self.setup is None:
+            self.setup = asyncio.ensure_future(asyncio.to_thread(setup_playbook))
+            self.setup.add_done_callback(self.setup_done)
+
+    def prewarm(self) -> None:
+        if self.enabled:
+            self.prepare()
+
+    def start_intro(self, user_score: int) -> None:
+        if self.intro is None:
+            self.intro = asyncio.create_task(self.generate_intro(user_score))
+            self.intro.add_done_callback(self.intro_done)
+
+    def setup_done(self, setup: asyncio.Future[PlaybookChat]) -> None:
+        # a failure reaches the turn waiting for it, if any, and the next turn
+        # sets the agent up again instead of getting the same error
+        if setup.cancelled():
+            self.setup = None
+        elif (error := setup.exception()) is not None:
+            print(f"Playbook agent setup failed: {error!r}")
+            self.setup = None
+
+    def intro_done(self, intro: asyncio.Task[tuple[PlaybookChat, str]]) -> None:
+        if intro.cancelled():
+            self.intro = None
+        elif (error := intro.exception()) is not None:
+            print(f"Playbook intro failed: {error!r}")
+            self.intro = None
+
+    async def generate_intro(self, user_score: int) -> tuple[PlaybookChat, str]:
+        self.warm = self.setup is not None and self.setup.done()
+
+        if self.warm:
+            metrics.hit("playbook.prewarm")
+        else:
+            metrics.miss("playbook.prewarm")
+
+        self.prepare()
+        assert self.setup is not None
+
+        chat = await self.setup
+        chat.user_score = user_score
+        return (chat, (await chat.start_conversation()).response)
+
+    async def start_conversation(self, user_score: int) -> tuple[PlaybookChat, str]:
+        self.start_intro(user_score)
+        assert self.intro is not None
+        return await self.intro
+
+
+def setup_playbook() -> PlaybookChat:
+    with metrics.timed("playbook.setup"):
+        # once per chat, whether it reuses the process's connection
+        if playbook_retriever.index is not None:
+            metrics.hit("playbook_retriever.shared")
+        else:
+            metrics.miss("playbook_retriever.shared")
+
+        playbook_retriever.connect()
+        return PlaybookChat()
@@ -1,22 +1,53 @@
 import re
+import time
+from typing import Any
 
+from ..database import Database
 from ..utils.text_utils import TextFormat
 from .flow import Flow, FlowResponse
-from .playbook_chat import PlaybookChat
+from .playbook_chat import PlaybookChat, PlaybookWarmer
 from .question_chat import QuestionChat
-from ..utils import text_utils
+from ..utils import metrics, streaming, text_utils
+
+# the chat asks 10 questions, start setting up the playbook agent a few before
+PREWARM_AFTER_ANSWERS = 7
 
 
 class QuestionAndPlaybookChat(Flow):
-    def __init__(self, text_format: TextFormat) -> None:
+    def __init__(self, text_format: TextFormat, flow: Flow | None = None) -> None:
         self.text_format = text_format
 
-        self.flow: Flow = QuestionChat()
+        self.flow: Flow = flow or QuestionChat()
+        self.playbook = PlaybookWarmer()
+
+    def get_state(self) -> dict[str, Any]:
+        return {
+            "text_format": self.text_format.name,
+            "playbook": isinstance(self.flow, PlaybookChat),
+            "flow": self.flow.get_state(),
+        }
+
+    @classmethod
+    def from_state(
+        cls, state: dict[str, Any], db: Database
+    ) -> "QuestionAndPlaybookChat":
+        flow_class = PlaybookChat if state["playbook"] else QuestionChat
+        return cls(
+            TextFormat[state["text_format"]], flow_class.from_state(state["flow"], db)
+        )
 
     async def start_conversation(self) -> FlowResponse[str]:
         return await self.flow.start_conversation()
 
     async def submit_message(self, text: str) -> FlowResponse[list[str]]:
+        started = time.perf_counter()
+
+        if (
+            isinstance(self.flow, QuestionChat)
+            and self.flow.answer_count >= PREWARM_AFTER_ANSWERS
+        ):
+            self.playbook.prewarm()
+
         response = (await self.flow.submit_message(text)).response[0]
 
         if match := re.search(r"Score: (?P<score>\d+)", response, re.IGNORECASE):
@@ -25,9 +56,15 @@ class QuestionAndPlaybookChat(Flow):
             score_message = text_utils.remote_work_score_message(
                 user_score, self.text_format
             )
+            # before the intro, which streams as it's generated
+            streaming.send_message(score_message)
+
+            self.flow, response = await self.playbook.start_conversation(user_score)
 
-            self.flow = PlaybookChat(user_score)
-            response = (await self.flow.start_conversation()).response
+            metrics.record_time(
+                f"question_chat.final_turn.{'warm' if self.playbook.warm else 'cold'}",
+                time.perf_counter() - started,
+            )
 
         else:
             score_message = None
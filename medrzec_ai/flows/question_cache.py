@@ -0,0 +1,46 @@
+import json
+import os
+from pathlib import Path
+
+# runtime data, kept out of the package; relative to the working directory
+DEFAULT_PATH = Path("rendered_questions.json")
+
+
+class QuestionCache:
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.entries: dict[str, dict[str, str]] | None = None
+
+    def get(self, key: str, question: str) -> str | None:
+        entry = self.load().get(key)
+
+        # the question was reworded since it was rendered
+        if entry is None or entry["question"] != question:
+            return None
+
+        return entry["text"]
+
+    def put(self, key: str, question: str, text: str) -> None:
+        self.load()[key] = {"question": question, "text": text}
+        self.save()
+
+    def load(self) -> dict[str, dict[str, str]]:
+        if self.entries is None:
+            try:
+                self.entries = json.loads(self.path.read_text(encoding="utf8"))
+            except FileNotFoundError:
+                self.entries = {}
+
+        return self.entries
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = self.path.with_suffix(".tmp")
+        temporary_path.write_text(
+            json.dumps(self.load(), ensure_ascii=False, indent=2, sort_keys=True),
+            encoding="utf8",
+        )
+        os.replace(temporary_path, self.path)
+
+
+question_cache = QuestionCache(os.getenv("QUESTION_CACHE_PATH") or DEFAULT_PATH)
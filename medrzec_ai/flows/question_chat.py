@@ -1,9 +1,12 @@
-from langchain.chat_models import ChatOpenAI
+from typing import Any
+
 from langchain.memory import ConversationBufferMemory
 from langchain.schema import HumanMessage
 
 from ..conversation_chain import CleanConversationChain
-from .flow import Flow, FlowResponse
+from ..database import Database
+from ..utils import llm_routes
+from .flow import Flow, FlowResponse, dump_messages, load_messages
 
 PREDEFINED_MESSAGES = [
     HumanMessage(
@@ -36,13 +39,28 @@ FINAL_HUMAN_MESSAGE = "Start by asking the first question now."
 
 class QuestionChat(Flow):
     def __init__(self) -> None:
-        llm = ChatOpenAI(
-            temperature=1, model="gpt-4"
-        )  # pyright: ignore [reportGeneralTypeIssues]
+        llm = llm_routes.chat_llm("question_chat")
         memory = ConversationBufferMemory()
         memory.chat_memory.messages.extend(PREDEFINED_MESSAGES)
+        self.memory = memory
         self.chain = CleanConversationChain(llm=llm, memory=memory)
 
+    def get_state(self) -> dict[str, Any]:
+        messages = self.memory.chat_memory.messages[len(PREDEFINED_MESSAGES) :]
+        return {"messages": dump_messages(messages)}
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any], db: Database) -> "QuestionChat":
+        chat = cls()
+        chat.memory.chat_memory.messages.extend(load_messages(state["messages"]))
+        return chat
+
+    @property
+    def answer_count(self) -> int:
+        # skips the predefined prompt and FINAL_HUMAN_MESSAGE
+        messages = self.memory.chat_memory.messages[len(PREDEFINED_MESSAGES) + 1 :]
+        return sum(message.type == "human" for message in messages)
+
     async def start_conversation(self) -> FlowResponse[str]:
         response = (await self.chain.acall(FINAL_HUMAN_MESSAGE))["response"]
         return FlowResponse(response)
@@ -1,16 +1,56 @@
 import asyncio
 import dataclasses
+import difflib
 import math
+import os
+import re
+from collections.abc import Callable
 from enum import Enum, auto
+from typing import Any
 
 from fastapi import HTTPException
 from langchain.agents import AgentType, Tool, initialize_agent
 from langchain.chains import LLMChain
-from langchain.chat_models import ChatOpenAI
 from langchain.prompts import PromptTemplate
-from ..utils import text_utils
+from ..utils import llm_routes, metrics, streaming, text_utils
 from ..utils.text_utils import TextFormat, ChatMemory
+from ..database import Database
 from .flow import Flow, FlowResponse
+from .question_cache import question_cache
+
+
+NUMBER_WORDS = {
+    # fmt: off
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "jeden": 1, "dwa": 2, "trzy": 3, "cztery": 4, "pięć": 5, "sześć": 6, "siedem": 7,
+    # fmt: on
+}
+NUMBER_ANSWER_RE = re.compile(
+    r"(?:(?:option|answer|number|no\.?|nr\.?)\s*)?#?(?P<number>\d+|[a-ząćęłńóśźż]+)"
+    r"(?:\s*(?:/|out of|z)\s*\d+)?"
+)
+MARKDOWN_RE = re.compile(r"[*_`]")
+
+QUESTION_ASKER_PROMPT = """\
+You're a conversational AI agent designed to ask user questions regarding their remote work experience.
+
+Previously asked questions for reference:
+{history}
+
+---
+
+System: Your task is to ask the following question and provide the possible answers.
+Use Markdown formatting and add emojis.
+
+You will ask question {question_number} of {question_amount}:
+{question}
+
+The possible answers are:
+{answers}
+
+Nicely formatted question with possible answers: """
+# part of the rendered question cache keys, bump when the prompt changes
+QUESTION_PROMPT_VERSION = 1
 
 
 class AnswerException(Exception):
@@ -28,6 +68,10 @@ class Question:
     answers: list[str] | None = None
     points: list[int] = dataclasses.field(default_factory=lambda: [-2, -1, 0, 1, 2])
 
+    @property
+    def answer_count(self) -> int:
+        return 5 if self.answers is None else len(self.answers)
+
 
 def get_questions(role: TeamRoles, text_format: TextFormat) -> list[Question]:
     questions = [
@@ -261,6 +305,7 @@ def get_questions(role: TeamRoles, text_format: TextFormat) -> list[Question]:
 
 class RemoteWorkScoreChat(Flow):
     def __init__(self, role: TeamRoles, text_format: TextFormat) -> None:
+        self.role = role
         self.text_format = text_format
 
         self.questions = get_questions(role, text_format)
@@ -268,38 +313,10 @@ class RemoteWorkScoreChat(Flow):
         self.retry = False
         self.memory = ChatMemory(max_size=15)
 
-        llm = ChatOpenAI(temperature=1, model="gpt-4", client=None)
-
-        self.question_asker = LLMChain(
-            llm=llm,
-            prompt=PromptTemplate(
-                input_variables=[
-                    "question_number",
-                    "question_amount",
-                    "question",
-                    "answers",
-                    "history",
-                ],
-                template="""\
-You're a conversational AI agent designed to ask user questions regarding their remote work experience.
-
-Previously asked questions for reference:
-{history}
-
----
-
-System: Your task is to ask the following question and provide the possible answers.
-Use Markdown formatting and add emojis.
-
-You will ask question {question_number} of {question_amount}:
-{question}
-
-The possible answers are:
-{answers}
-
-Nicely formatted question with possible answers: """,
-            ),
-        )
+        self.question_asker = create_question_asker()
+        self.personalize_questions = os.getenv("PERSONALIZE_QUESTIONS") in ("true", "1")
+        # called with the score as soon as the last answer is submitted
+        self.on_complete: Callable[[int], None] | None = None
 
         self.response_parser = initialize_agent(
             [
@@ -309,10 +326,27 @@ Nicely formatted question with possible answers: """,
                     description="Submit user's answer to the question.",
                 ),
             ],
-            llm,
+            llm_routes.chat_llm("remote_work_score.response_parser"),
             agent=AgentType.OPENAI_FUNCTIONS,
         )
 
+    def get_state(self) -> dict[str, Any]:
+        return {
+            "role": self.role.name,
+            "text_format": self.text_format.name,
+            "answers": self.answers,
+            "retry": self.retry,
+            "memory": self.memory.memory,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any], db: Database) -> "RemoteWorkScoreChat":
+        chat = cls(TeamRoles[state["role"]], TextFormat[state["text_format"]])
+        chat.answers = state["answers"]
+        chat.retry = state["retry"]
+        chat.memory.memory = state["memory"]
+        return chat
+
     async def start_conversation(self) -> FlowResponse[str]:
         response = await self.next_question()
         return FlowResponse(response)
@@ -320,10 +354,43 @@ Nicely formatted question with possible answers: """,
     async def submit_message(self, text: str) -> FlowResponse[list[str]]:
         question_index = len(self.answers)
         question = self.questions[question_index]
+
+        if (answer := parse_answer(text, question.answers)) is not None:
+            metrics.hit("remote_work_score.fast_path")
+            self.submit_answer(str(answer))
+            response = acknowledge_answer(answer, question.answers, self.text_format)
+        else:
+            metrics.miss("remote_work_score.fast_path")
+            response = await self.parse_with_llm(text, question)
+
+        streaming.send_message(response)
+        flow_end: bool = False
+        score: int | None = None
+        messages: list[str] = [response]
+
+        if question_index + 1 >= len(self.questions):
+            flow_end = True
+            score = calculate_score(self.questions, self.answers)
+            messages.append(
+                text_utils.remote_work_score_message(score, self.text_format)
+            )
+            streaming.send_message(messages[-1])
+        elif not self.retry:
+            self.memory.add_message(text)
+            self.memory.add_message(response)
+            messages.append(await self.next_question())
+
+        return FlowResponse(
+            messages,
+            flow_suggestions=[] if flow_end else None,
+            extra={"remote_work_score": score} if score is not None else {},
+        )
+
+    async def parse_with_llm(self, text: str, question: Question) -> str:
         available_answers = format_answers(question.answers)
 
         try:
-            response = await asyncio.to_thread(
+            return await asyncio.to_thread(
                 self.response_parser.run,
                 f"""\
 You're a conversational AI agent designed to parse and submit user's responses to a questionnaire regarding their remote work experience.
@@ -351,40 +418,22 @@ Feedback for the user: """,
         except AnswerException as e:
             raise HTTPException(400, str(e)) from e
 
-        flow_end: bool = False
-        score: int | None = None
-        messages: list[str] = [response]
-
-        if question_index + 1 >= len(self.questions):
-            flow_end = True
-            score = calculate_score(self.questions, self.answers)
-            messages.append(
-                text_utils.remote_work_score_message(score, self.text_format)
-            )
-        elif not self.retry:
-            self.memory.add_message(text)
-            self.memory.add_message(response)
-            messages.append(await self.next_question())
-
-        return FlowResponse(
-            messages,
-            flow_suggestions=[] if flow_end else None,
-            extra={"remote_work_score": score} if score is not None else {},
-        )
-
     async def next_question(self) -> str:
         self.retry = True
         question_index = len(self.answers)
-        question = self.questions[question_index]
-        available_answers = format_answers(question.answers)
 
-        response = await self.question_asker.arun(
-            question_number=question_index + 1,
-            question_amount=len(self.questions),
-            question=question.question,
-            answers=available_answers,
-            history=self.memory,
-        )
+        if self.personalize_questions:
+            response = await render_question(
+                self.question_asker, self.questions, question_index, self.memory
+            )
+        else:
+            response = await render_cached_question(
+                self.question_asker,
+                self.role,
+                self.text_format,
+                self.questions,
+                question_index,
+            )
 
         self.memory.add_message(response)
         return response
@@ -397,8 +446,7 @@ Feedback for the user: """,
                 f"{answer!r} is not a valid option. Try again."
             ) from e
 
-        answers = self.questions[len(self.answers)].answers
-        answers = 5 if answers is None else len(answers)
+        answers = self.questions[len(self.answers)].answer_count
 
         if answer_int > answers or answer_int < 1:
             raise AnswerException(f"{answer} is not a valid option. Try again.")
@@ -407,6 +455,66 @@ Feedback for the user: """,
         self.answers.append(answer_int - 1)
         print(f"submitted {answer_int}")
 
+        if self.on_complete is not None and len(self.answers) == len(self.questions):
+            self.on_complete(calculate_score(self.questions, self.answers))
+
+
+def create_question_asker() -> LLMChain:
+    return LLMChain(
+        llm=llm_routes.chat_llm("remote_work_score.question_asker"),
+        prompt=PromptTemplate(
+            input_variables=[
+                "question_number",
+                "question_amount",
+                "question",
+                "answers",
+                "history",
+            ],
+            template=QUESTION_ASKER_PROMPT,
+        ),
+    )
+
+
+async def render_question(
+    question_asker: LLMChain,
+    questions: list[Question],
+    question_index: int,
+    history: ChatMemory,
+) -> str:
+    question = questions[question_index]
+
+    return await question_asker.arun(
+        question_number=question_index + 1,
+        question_amount=len(questions),
+        question=question.question,
+        answers=format_answers(question.answers),
+        history=history,
+    )
+
+
+async def render_cached_question(
+    question_asker: LLMChain,
+    role: TeamRoles,
+    text_format: TextFormat,
+    questions: list[Question],
+    question_index: int,
+) -> str:
+    key = f"{role.name}:{text_format.name}:{question_index}:{QUESTION_PROMPT_VERSION}"
+    question = questions[question_index]
+    source = f"{question.question}\n{format_answers(question.answers)}"
+
+    if (text := question_cache.get(key, source)) is not None:
+        metrics.hit("remote_work_score.question_cache")
+        streaming.send_message(text)
+        return text
+
+    metrics.miss("remote_work_score.question_cache")
+    text = await render_question(
+        question_asker, questions, question_index, ChatMemory(max_size=0)
+    )
+    question_cache.put(key, source, text)
+    return text
+
 
 def format_answers(answers: list[str] | None) -> str:
     if answers is None:
@@ -415,6 +523,63 @@ def format_answers(answers: list[str] | None) -> str:
         return "\n".join(f"{i}. {answer}" for i, answer in enumerate(answers, 1))
 
 
+def parse_answer(text: str, answers: list[str] | None) -> int | None:
+    normalized = normalize_answer(text)
+    options = [normalize_answer(answer) for answer in answers or []]
+    amount = len(options) or 5
+
+    if match := NUMBER_ANSWER_RE.fullmatch(normalized):
+        number = match["number"]
+        answer = int(number) if number.isdigit() else NUMBER_WORDS.get(number)
+
+        if answer is not None:
+            return answer if 1 <= answer <= amount else None
+
+    if normalized in options:
+        return options.index(normalized) + 1
+
+    close_matches = difflib.get_close_matches(normalized, options, n=2, cutoff=0.85)
+
+    # a typo of one option, but not something that could be either of two
+    if len(close_matches) == 1:
+        return options.index(close_matches[0]) + 1
+
+    return None
+
+
+def normalize_answer(text: str) -> str:
+    text = MARKDOWN_RE.sub("", text).lower()
+    return " ".join(text.split()).strip(" .!)")
+
+
+def acknowledge_answer(
+    answer: int, answers: list[str] | None, text_format: TextFormat
+) -> str:
+    bold = "**" if text_format is TextFormat.MARKDOWN else "*"
+
+    if answers is None:
+        chosen = f"{answer}/5"
+    else:
+        chosen = MARKDOWN_RE.sub("", answers[answer - 1]).strip()
+
+    return f"Got it, your answer is {bold}{chosen}{bold} ✅"
+
+
+def validate_answers(questions: list[Question], answers: list[int]) -> list[int]:
+    # takes 1-based option numbers, like the chat, and returns indices
+    if len(answers) != len(questions):
+        raise AnswerException(f"Expected {len(questions)} answers, got {len(answers)}.")
+
+    for number, (question, answer) in enumerate(zip(questions, answers), 1):
+        if not 1 <= answer <= question.answer_count:
+            raise AnswerException(
+                f"{answer} is not a valid option for question {number}, "
+                f"expected a number between 1 and {question.answer_count}."
+            )
+
+    return [answer - 1 for answer in answers]
+
+
 def calculate_score(questions: list[Question], answers: list[int]) -> int:
     min_points = sum(min(question.points) for question in questions)
     max_points = sum(max(question.points) for question in questions)
@@ -1,24 +1,80 @@
+import asyncio
+import time
+from typing import Any
+
+from ..database import Database
+from ..utils import metrics
 from ..utils.text_utils import TextFormat
 from .flow import Flow, FlowResponse
-from .playbook_chat import PlaybookChat
+from .playbook_chat import PlaybookChat, PlaybookWarmer
 from .remote_work_score import RemoteWorkScoreChat, TeamRoles
 
+# how many questions before the end the playbook agent starts being set up
+PREWARM_QUESTIONS = 3
+
 
 class RemoteWorkScoreAndPlaybookChat(Flow):
-    def __init__(self, role: TeamRoles, text_format: TextFormat) -> None:
+    def __init__(
+        self, role: TeamRoles, text_format: TextFormat, flow: Flow | None = None
+    ) -> None:
+        self.role = role
         self.text_format = text_format
 
-        self.flow: Flow = RemoteWorkScoreChat(role, text_format)
+        self.flow: Flow = flow or RemoteWorkScoreChat(role, text_format)
+        self.playbook = PlaybookWarmer()
+
+    def get_state(self) -> dict[str, Any]:
+        return {
+            "role": self.role.name,
+            "text_format": self.text_format.name,
+            "playbook": isinstance(self.flow, PlaybookChat),
+            "flow": self.flow.get_state(),
+        }
+
+    @classmethod
+    def from_state(
+        cls, state: dict[str, Any], db: Database
+    ) -> "RemoteWorkScoreAndPlaybookChat":
+        flow_class = PlaybookChat if state["playbook"] else RemoteWorkScoreChat
+        return cls(
+            TeamRoles[state["role"]],
+            TextFormat[state["text_format"]],
+            flow_class.from_state(state["flow"], db),
+        )
 
     async def start_conversation(self) -> FlowResponse[str]:
         return await self.flow.start_conversation()
 
     async def submit_message(self, text: str) -> FlowResponse[list[str]]:
+        started = time.perf_counter()
+
+        if isinstance(self.flow, RemoteWorkScoreChat):
+            self.watch_questionnaire(self.flow)
+
         response = await self.flow.submit_message(text)
         messages = response.response
 
         if response.flow_suggestions is not None:
-            self.flow = PlaybookChat(response.extra["remote_work_score"])
-            messages.append((await self.flow.start_conversation()).response)
+            self.flow, intro = await self.playbook.start_conversation(
+                response.extra["remote_work_score"]
+            )
+            messages.append(intro)
+
+            metrics.record_time(
+                f"remote_work_score.final_turn.{'warm' if self.playbook.warm else 'cold'}",
+                time.perf_counter() - started,
+            )
 
         return FlowResponse(messages)
+
+    def watch_questionnaire(self, flow: RemoteWorkScoreChat) -> None:
+        if len(flow.questions) - len(flow.answers) <= PREWARM_QUESTIONS:
+            self.playbook.prewarm()
+
+        loop = asyncio.get_running_loop()
+
+        # the LLM response parser submits answers from a worker thread
+        def on_complete(user_score: int) -> None:
+            loop.call_soon_threadsafe(self.playbook.start_intro, user_score)
+
+        flow.on_complete = on_complete
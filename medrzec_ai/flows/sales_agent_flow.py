@@ -1,8 +1,10 @@
-from langchain import OpenAI
+import os
+from typing import Any
 
 from medrzec_ai.agents.sales.agent import Agent, ConversationChain, StageAnalyzerChain
 from medrzec_ai.agents.sales.data import CONVERSATION_STAGES, PAID_CONVERSATION_STAGES
 from medrzec_ai.database import Database, User
+from medrzec_ai.utils import llm_routes, streaming
 
 from .flow import Flow, FlowResponse
 
@@ -12,31 +14,56 @@ class SalesAgentChat(Flow):
         self.conversation_stages = CONVERSATION_STAGES
         self.db = db
         self.lastQuestion = None
-        llm = OpenAI(model_name="gpt-4", temperature=0.5)
         self.user = user
+        # restored chats only know the email until the user is looked up
+        self.user_email = user and user.email
         self.user_token = user_token
         self.agent = Agent(
-            stage_analyzer_chain=StageAnalyzerChain.from_llm(llm),
-            conversation_chain=ConversationChain.from_llm(llm),  # type: ignore
+            stage_analyzer_chain=StageAnalyzerChain.from_llm(
+                llm_routes.completion_llm("sales.stage_analyzer")
+            ),
+            conversation_chain=ConversationChain.from_llm(  # type: ignore
+                llm_routes.completion_llm("sales.conversation")
+            ),
+            speculative=os.getenv("SPECULATIVE_SALES_AGENT") in ("true", "1"),
         )
 
+    def get_state(self) -> dict[str, Any]:
+        return {
+            "user": self.user_email,
+            "user_token": self.user_token,
+            "last_question": self.lastQuestion,
+            "agent": self.agent.get_state(),
+        }
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any], db: Database) -> "SalesAgentChat":
+        chat = cls(db, None, state["user_token"])
+        chat.user_email = state["user"]
+        chat.lastQuestion = state["last_question"]
+        chat.agent.load_state(state["agent"])
+        return chat
+
     async def start_conversation(self) -> FlowResponse[str]:
-        response = self.agent.step("hello")
+        response = await self.agent.astep("hello")
         return FlowResponse(response)
 
     async def submit_message(self, message: str) -> FlowResponse[list[str]]:
-        if self.user and self.db.get_purchases(self.user.id):
+        if self.user is None and self.user_email is not None:
+            self.user = await self.db.get_user(self.user_email)
+
+        if self.user and await self.db.is_paid(self.user.id):
             self.conversation_stages = (
                 CONVERSATION_STAGES[:-1] + PAID_CONVERSATION_STAGES
             )
 
-        response = self.agent.step(message)
+        response = await self.agent.astep(message)
         messages = [response]
         # current_stage = self.conversation_stages[self.agent.current_stage]
 
         # if self.lastQuestion is not None and self.user is not None:
         #     (score, magnitude) = analyze_sentiment(message)
-        #     self.db.add_answer(
+        #     await self.db.add_answer(
         #         answer=Answer(
         #             question=self.lastQuestion,
         #             response=message,
@@ -52,6 +79,7 @@ class SalesAgentChat(Flow):
             messages.append(
                 f"Unlock access to your personalized [**Distributed Work: Pro Insights**]({url})."
             )
+            streaming.send_message(messages[-1])
 
         self.lastQuestion = response
         return FlowResponse(messages)
@@ -0,0 +1,82 @@
+import base64
+import json
+import os
+import time
+import zlib
+from typing import Any
+
+from ..database import Database
+from .flow import Flow
+from .playbook_chat import PlaybookChat
+from .question_and_playbook_chat import QuestionAndPlaybookChat
+from .question_chat import QuestionChat
+from .remote_work_score import RemoteWorkScoreChat
+from .remote_work_score_and_playbook import RemoteWorkScoreAndPlaybookChat
+from .sales_agent_flow import SalesAgentChat
+
+FLOW_TYPES: dict[str, type[Flow]] = {
+    flow.__name__: flow
+    for flow in [
+        PlaybookChat,
+        QuestionAndPlaybookChat,
+        QuestionChat,
+        RemoteWorkScoreAndPlaybookChat,
+        RemoteWorkScoreChat,
+        SalesAgentChat,
+    ]
+}
+
+
+def encode_flow(flow: Flow, version: int) -> bytes:
+    snapshot = {"type": type(flow).__name__, "version": version, **flow.get_state()}
+    return json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def dump_flow(flow: Flow, version: int) -> bytes:
+    return compress_snapshot(encode_flow(flow, version))
+
+
+def compress_snapshot(state: bytes) -> bytes:
+    return zlib.compress(state)
+
+
+def load_snapshot(data: bytes) -> tuple[int, dict[str, Any]]:
+    snapshot = json.loads(zlib.decompress(data))
+    return (snapshot.pop("version"), snapshot)
+
+
+def restore_flow(snapshot: dict[str, Any], db: Database) -> Flow:
+    flow_type = FLOW_TYPES[snapshot.pop("type")]
+    return flow_type.from_state(snapshot, db)
+
+
+def write_snapshot_file(path: str, conversations: dict[str, tuple[float, bytes]]):
+    content = json.dumps(
+        {
+            "saved_at": time.time(),
+            "conversations": {
+                chat_id: [idle, base64.b64encode(data).decode()]
+                for chat_id, (idle, data) in conversations.items()
+            },
+        }
+    ).encode()
+
+    # written in one go next to the target, then swapped in atomically
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(content)
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(temporary_path, path)
+
+
+def read_snapshot_file(path: str) -> dict[str, tuple[float, bytes]]:
+    with open(path, "rb") as file:
+        content = json.load(file)
+
+    downtime = max(time.time() - content["saved_at"], 0)
+    return {
+        chat_id: (idle + downtime, base64.b64decode(data))
+        for chat_id, (idle, data) in content["conversations"].items()
+    }
@@ -0,0 +1,294 @@
+import asyncio
+import base64
+import dataclasses
+import hashlib
+import json
+import os
+import time
+from collections import Counter
+from collections.abc import Container, Iterable, Iterator
+from typing import Any, Protocol
+
+import numpy as np
+
+CHUNK_SIZE = 256
+SEPARATOR = "\n\n"
+READ_SIZE = 64 * 1024
+# sources are named relative to the project root
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+@dataclasses.dataclass(frozen=True)
+class Chunk:
+    id: str
+    source: str
+    text: str
+
+
+@dataclasses.dataclass
+class IngestionPlan:
+    added: list[Chunk]
+    removed: dict[str, str | None]  # id to text, when known
+    unchanged: int
+
+    def is_empty(self) -> bool:
+        return not self.added and not self.removed
+
+
+@dataclasses.dataclass
+class IngestionStats:
+    seen: set[str] = dataclasses.field(default_factory=set)
+    embedded: int = 0
+    skipped: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.embedded / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.embedded} chunks embedded in {self.batches} batches, "
+            f"{self.skipped} skipped, {self.elapsed:.1f}s "
+            f"({self.chunks_per_second:.1f} chunks/s)"
+        )
+
+
+class Embedder(Protocol):
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        ...
+
+
+class VectorSink(Protocol):
+    async def upsert(self, chunks: list[Chunk], embeddings: list[list[float]]) -> None:
+        ...
+
+
+class MemorySink:
+    def __init__(self) -> None:
+        self.vectors: dict[str, tuple[Chunk, list[float]]] = {}
+
+    async def upsert(self, chunks: list[Chunk], embeddings: list[list[float]]) -> None:
+        for chunk, embedding in zip(chunks, embeddings, strict=True):
+            self.vectors[chunk.id] = (chunk, embedding)
+
+
+class PineconeSink:
+    def __init__(self, index: Any) -> None:
+        self.index = index
+
+    async def upsert(self, chunks: list[Chunk], embeddings: list[list[float]]) -> None:
+        vectors = [
+            (chunk.id, embedding, {"source": chunk.source, "text": chunk.text})
+            for chunk, embedding in zip(chunks, embeddings, strict=True)
+        ]
+        await asyncio.to_thread(self.index.upsert, vectors, show_progress=False)
+
+
+class Checkpoint:
+    # append-only, one line per uploaded batch, so a crash loses at most a batch
+    def __init__(self, path: str, keep_embeddings: bool = False) -> None:
+        self.path = path
+        self.keep_embeddings = keep_embeddings
+        self.done: dict[str, list[float] | None] = {}
+
+        if os.path.exists(path):
+            with open(path, encoding="utf8") as file:
+                for line in file:
+                    self.done.update(
+                        (id_, decode_embedding(data) if data else None)
+                        for id_, data in json.loads(line).items()
+                    )
+
+    def mark(self, chunks: list[Chunk], embeddings: list[list[float]]) -> None:
+        entry = {
+            chunk.id: encode_embedding(embedding) if self.keep_embeddings else None
+            for chunk, embedding in zip(chunks, embeddings, strict=True)
+        }
+
+        with open(self.path, "a", encoding="utf8") as file:
+            file.write(json.dumps(entry) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+        if self.keep_embeddings:
+            self.done.update(zip(entry, embeddings))
+        else:
+            self.done.update(entry)
+
+    def remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+async def ingest(
+    chunks: Iterable[Chunk],
+    embedder: Embedder,
+    sink: VectorSink,
+    skip: Container[str] = (),
+    checkpoint: Checkpoint | None = None,
+    batch_size: int = 100,
+    concurrency: int = 4,
+) -> IngestionStats:
+    stats = IngestionStats()
+    started = time.perf_counter()
+    # bounded, so a slow embedder or upload pauses reading instead of buffering
+    batches: asyncio.Queue[list[Chunk] | None] = asyncio.Queue(concurrency)
+    uploads: asyncio.Queue[tuple[list[Chunk], list[list[float]]] | None]
+    uploads = asyncio.Queue(concurrency)
+
+    async def read() -> None:
+        batch: list[Chunk] = []
+
+        for chunk in chunks:
+            stats.seen.add(chunk.id)
+
+            if chunk.id in skip or (checkpoint and chunk.id in checkpoint.done):
+                stats.skipped += 1
+                continue
+
+            batch.append(chunk)
+
+            if len(batch) == batch_size:
+                await batches.put(batch)
+                batch = []
+
+        if batch:
+            await batches.put(batch)
+
+        for _ in range(concurrency):
+            await batches.put(None)
+
+    async def embed() -> None:
+        while (batch := await batches.get()) is not None:
+            embeddings = await embedder.aembed_documents(
+                [chunk.text for chunk in batch]
+            )
+            await uploads.put((batch, embeddings))
+
+        await uploads.put(None)
+
+    async def upload() -> None:
+        finished_embedders = 0
+
+        while finished_embedders < concurrency:
+            if (item := await uploads.get()) is None:
+                finished_embedders += 1
+                continue
+
+            batch, embeddings = item
+            await sink.upsert(batch, embeddings)
+
+            if checkpoint is not None:
+                checkpoint.mark(batch, embeddings)
+
+            stats.embedded += len(batch)
+            stats.batches += 1
+
+    try:
+        async with asyncio.TaskGroup() as group:
+            group.create_task(read())
+            for _ in range(concurrency):
+                group.create_task(embed())
+            group.create_task(upload())
+    except ExceptionGroup as e:
+        # the other tasks were only cancelled because of the first failure
+        raise e.exceptions[0]
+
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+def iter_paragraphs(path: str) -> Iterator[str]:
+    with open(path, encoding="utf8") as file:
+        buffer = ""
+
+        while block := file.read(READ_SIZE):
+            *paragraphs, buffer = (buffer + block).split(SEPARATOR)
+            yield from filter(None, paragraphs)
+
+        if buffer:
+            yield buffer
+
+
+def iter_texts(path: str) -> Iterator[str]:
+    # the same chunks as CharacterTextSplitter(chunk_size=256, chunk_overlap=0),
+    # without loading the whole document
+    current: list[str] = []
+    total = 0
+
+    for paragraph in iter_paragraphs(path):
+        separator = len(SEPARATOR) if current else 0
+
+        if current and total + len(paragraph) + separator > CHUNK_SIZE:
+            if text := SEPARATOR.join(current).strip():
+                yield text
+            current, total, separator = [], 0, 0
+
+        current.append(paragraph)
+        total += len(paragraph) + separator
+
+    if current and (text := SEPARATOR.join(current).strip()):
+        yield text
+
+
+def iter_chunks(path: str) -> Iterator[Chunk]:
+    source = source_name(path)
+    occurrences: Counter[str] = Counter()
+
+    for text in iter_texts(path):
+        # repeated chunks (e.g. a recurring heading) still get distinct ids
+        yield Chunk(chunk_id(source, text, occurrences[text]), source, text)
+        occurrences[text] += 1
+
+
+def source_name(path: str) -> str:
+    # the same for ./docs/x.md, docs/x.md or an absolute path, since chunk ids
+    # and Pinecone's source filter depend on it
+    return os.path.relpath(os.path.realpath(path), ROOT).replace(os.sep, "/")
+
+
+def chunk_id(source: str, text: str, occurrence: int = 0) -> str:
+    content = f"{source}\0{text}\0{occurrence}".encode()
+    return hashlib.sha256(content).hexdigest()[:32]
+
+
+def encode_embedding(embedding: list[float]) -> str:
+    return base64.b64encode(np.asarray(embedding, dtype=np.float32).tobytes()).decode()
+
+
+def decode_embedding(data: str) -> list[float]:
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32).tolist()
+
+
+def plan_ingestion(
+    chunks: list[Chunk], existing: dict[str, str | None]
+) -> IngestionPlan:
+    ids = {chunk.id for chunk in chunks}
+
+    return IngestionPlan(
+        added=[chunk for chunk in chunks if chunk.id not in existing],
+        removed={id_: text for id_, text in existing.items() if id_ not in ids},
+        unchanged=len(ids & existing.keys()),
+    )
+
+
+def format_plan(plan: IngestionPlan, verbose: bool = True, preview: int = 60) -> str:
+    def shorten(text: str | None) -> str:
+        if text is None:
+            return "(text unknown)"
+        text = " ".join(text.split())
+        return text if len(text) <= preview else text[: preview - 1] + "…"
+
+    lines = [
+        f"{len(plan.added)} added, {len(plan.removed)} removed, "
+        f"{plan.unchanged} unchanged"
+    ]
+
+    if not verbose:
+        return lines[0]
+
+    lines += [f"+ {chunk.id[:8]} {shorten(chunk.text)}" for chunk in plan.added]
+    lines += [f"- {id_[:8]} {shorten(text)}" for id_, text in plan.removed.items()]
+    return "\n".join(lines)
@@ -0,0 +1,107 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+from pathlib import Path
+
+TOKEN_RE = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    """
+    a about an and are as at be by can do does for from have how i in is it my
+    of on or our should that the their this to we what when where which who
+    why with you your
+    """.split()
+)
+LEXICAL_INDEX_FILE = "lexical.json"
+K1 = 1.5
+B = 0.75
+# short keyword queries with few enough matches skip the embeddings
+MAX_CONFIDENT_TERMS = 3
+
+
+class LexicalIndex:
+    def __init__(self, texts: list[str], postings: dict[str, list[list[int]]]) -> None:
+        self.texts = texts
+        self.postings = postings  # term to [chunk, term frequency] pairs
+        self.lengths = [len(tokenize(text)) for text in texts]
+        self.average_length = sum(self.lengths) / len(texts) if texts else 0.0
+
+    @classmethod
+    def build(cls, texts: list[str]) -> "LexicalIndex":
+        postings: dict[str, list[list[int]]] = {}
+
+        for chunk, text in enumerate(texts):
+            for term, frequency in Counter(tokenize(text)).items():
+                postings.setdefault(term, []).append([chunk, frequency])
+
+        return cls(texts, postings)
+
+    @classmethod
+    def load(cls, path: str | os.PathLike) -> "LexicalIndex":
+        data = json.loads(Path(path).read_text(encoding="utf8"))
+        return cls(data["texts"], data["postings"])
+
+    def save(self, path: str | os.PathLike) -> None:
+        Path(path).write_text(
+            json.dumps({"texts": self.texts, "postings": self.postings}),
+            encoding="utf8",
+        )
+
+    def idf(self, term: str) -> float:
+        matches = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.texts) - matches + 0.5) / (matches + 0.5))
+
+    def search(self, query: str, k: int) -> list[tuple[int, float, int]]:
+        # (chunk, score, number of query terms it contains), best first
+        terms = set(tokenize(query))
+        scores: Counter[int] = Counter()
+        matched: Counter[int] = Counter()
+
+        for term in terms:
+            idf = self.idf(term)
+
+            for chunk, frequency in self.postings.get(term, ()):
+                length = self.lengths[chunk] / (self.average_length or 1)
+                scores[chunk] += (
+                    idf * frequency * (K1 + 1) / (frequency + K1 * (1 - B + B * length))
+                )
+                matched[chunk] += 1
+
+        return [
+            (chunk, score, matched[chunk]) for chunk, score in scores.most_common(k)
+        ]
+
+    def is_confident(self, query: str, results: list[tuple[int, float, int]]) -> bool:
+        # only when every chunk containing all the terms is among the results,
+        # a common term like "team" alone is left to the embeddings
+        terms = set(tokenize(query))
+
+        if not 0 < len(terms) <= MAX_CONFIDENT_TERMS or not results:
+            return False
+
+        complete = sum(matched == len(terms) for _, _, matched in results)
+        return 0 < complete == self.count_matching(terms)
+
+    def count_matching(self, terms: set[str]) -> int:
+        chunks: set[int] | None = None
+
+        for term in terms:
+            matching = {chunk for chunk, _ in self.postings.get(term, ())}
+            chunks = matching if chunks is None else chunks & matching
+
+        return len(chunks or ())
+
+
+def tokenize(text: str) -> list[str]:
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int, c: int = 60) -> list[str]:
+    scores: Counter[str] = Counter()
+
+    for ranking in rankings:
+        for rank, text in enumerate(ranking):
+            scores[text] += 1 / (c + rank + 1)
+
+    return [text for text, _ in scores.most_common(k)]
@@ -0,0 +1,92 @@
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+INT8_SCALE = 127
+
+
+class LocalIndex:
+    def __init__(self, path: str | os.PathLike, hnsw: bool = False) -> None:
+        path = Path(path)
+        meta = json.loads((path / "meta.json").read_text())
+
+        self.texts: list[str] = json.loads((path / "texts.json").read_text())
+        # chunk ids from medrzec_ai.ingestion, for incremental updates
+        self.ids: list[str] | None = None
+        if (path / "ids.json").exists():
+            self.ids = json.loads((path / "ids.json").read_text())
+        self.dtype = meta["dtype"]
+        # memory-mapped, so replicas on the same node share the page cache
+        self.embeddings = np.load(path / "embeddings.npy", mmap_mode="r")
+        self.hnsw: Any = build_hnsw(self.embeddings) if hnsw else None
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def query(self, embedding: list[float], k: int) -> list[str]:
+        return [self.texts[i] for i in self.top_k(embedding, k)]
+
+    def top_k(self, embedding: list[float], k: int) -> list[int]:
+        k = min(k, len(self))
+        query = normalize(np.asarray(embedding, dtype=np.float32))
+
+        if self.hnsw is not None:
+            labels, _ = self.hnsw.knn_query(query, k=k)
+            return labels[0].tolist()
+
+        scores = self.embeddings @ query
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])].tolist()
+
+
+def write_local_index(
+    path: str | os.PathLike,
+    texts: list[str],
+    embeddings: list[list[float]],
+    dtype: str = "float32",
+    ids: list[str] | None = None,
+) -> None:
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    matrix = normalize(np.asarray(embeddings, dtype=np.float32))
+
+    match dtype:
+        case "float32":
+            pass
+        case "int8":
+            matrix = np.round(matrix * INT8_SCALE).astype(np.int8)
+        case _:
+            raise ValueError(f"Unsupported local index dtype: {dtype}")
+
+    np.save(path / "embeddings.npy", matrix)
+    (path / "texts.json").write_text(json.dumps(texts, ensure_ascii=False))
+    if ids is not None:
+        (path / "ids.json").write_text(json.dumps(ids))
+    (path / "meta.json").write_text(
+        json.dumps({"dtype": dtype, "dimensions": matrix.shape[1]})
+    )
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def build_hnsw(embeddings: np.ndarray) -> Any:
+    try:
+        import hnswlib
+    except ImportError as e:
+        raise RuntimeError(
+            "PLAYBOOK_INDEX_HNSW requires hnswlib, install it with `pip install hnswlib`"
+        ) from e
+
+    vectors = normalize(np.asarray(embeddings, dtype=np.float32))
+    index = hnswlib.Index(space="ip", dim=vectors.shape[1])
+    index.init_index(max_elements=len(vectors), ef_construction=200, M=16)
+    index.add_items(vectors, np.arange(len(vectors)))
+    index.set_ef(64)
+    return index
@@ -0,0 +1,151 @@
+import asyncio
+import os
+import threading
+from typing import Protocol
+
+import pinecone
+from langchain.embeddings.openai import OpenAIEmbeddings
+from langchain.vectorstores import Pinecone
+
+from .embedding_cache import EmbeddingCache
+from .lexical_index import LEXICAL_INDEX_FILE, LexicalIndex, reciprocal_rank_fusion
+from .local_index import LocalIndex
+from .utils import metrics
+
+PLAYBOOK_INDEX = "playbook"
+
+
+class VectorIndex(Protocol):
+    def query(self, embedding: list[float], k: int) -> list[str]:
+        ...
+
+
+class PineconeIndex:
+    def __init__(self, index_name: str, embeddings: OpenAIEmbeddings) -> None:
+        pinecone.init(
+            os.environ["PINECONE_API_KEY"], environment=os.environ["PINECONE_ENV"]
+        )
+        self.vectorstore = Pinecone.from_existing_index(index_name, embeddings)
+
+    def query(self, embedding: list[float], k: int) -> list[str]:
+        results = self.vectorstore.similarity_search_by_vector_with_score(embedding, k)
+        return [doc.page_content for doc, _ in results]
+
+
+class PlaybookRetriever:
+    def __init__(
+        self,
+        index_name: str,
+        max_concurrency: int,
+        cache: EmbeddingCache,
+        local_path: str | None = None,
+        hnsw: bool = False,
+        lexical_path: str | None = None,
+    ) -> None:
+        self.index_name = index_name
+        self.cache = cache
+        self.local_path = local_path
+        self.hnsw = hnsw
+        self.lexical_path = lexical_path
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.lock = threading.Lock()
+        self.embeddings: OpenAIEmbeddings | None = None
+        self.index: VectorIndex | None = None
+        self.lexical: LexicalIndex | None = None
+
+    def connect(self) -> VectorIndex:
+        # blocking, called from a worker thread or once at startup
+        with self.lock:
+            if self.index is not None:
+                return self.index
+
+            with metrics.timed("playbook_retriever.connect"):
+                self.embeddings = OpenAIEmbeddings(client=None)
+
+                lexical_path = self.lexical_path
+
+                if self.local_path is not None:
+                    self.index = LocalIndex(self.local_path, self.hnsw)
+
+                    # exported next to the vectors by update_pinecone.py
+                    local_lexical_path = os.path.join(
+                        self.local_path, LEXICAL_INDEX_FILE
+                    )
+                    if lexical_path is None and os.path.exists(local_lexical_path):
+                        lexical_path = local_lexical_path
+                else:
+                    self.index = PineconeIndex(self.index_name, self.embeddings)
+
+                if lexical_path is not None:
+                    self.lexical = LexicalIndex.load(lexical_path)
+
+            return self.index
+
+    async def search(self, query: str, k: int = 4) -> list[str]:
+        async with self.semaphore:
+            with metrics.timed("playbook_retriever.search"):
+                index = await asyncio.to_thread(self.connect)
+                lexical: list[str] = []
+
+                if self.lexical is not None:
+                    with metrics.timed("playbook_retriever.lexical"):
+                        results = self.lexical.search(query, k)
+
+                    lexical = [self.lexical.texts[chunk] for chunk, _, _ in results]
+
+                    if self.lexical.is_confident(query, results):
+                        metrics.hit("playbook_retriever.lexical_only")
+                        return lexical
+
+                    metrics.miss("playbook_retriever.lexical_only")
+
+                with metrics.timed("playbook_retriever.embed"):
+                    embedding = await self.embed(query)
+
+                with metrics.timed("playbook_retriever.query"):
+                    if isinstance(index, LocalIndex):
+                        # sub-millisecond, not worth a thread hop
+                        vector = index.query(embedding, k)
+                    else:
+                        vector = await asyncio.to_thread(index.query, embedding, k)
+
+        if lexical:
+            return reciprocal_rank_fusion([vector, lexical], k)
+
+        return vector
+
+    async def embed(self, query: str) -> list[float]:
+        assert self.embeddings is not None
+        model = self.embeddings.model
+
+        if (embedding := await self.cache.get(model, query)) is not None:
+            metrics.hit("embedding_cache")
+
+            # credited with what an API call has cost on average so far
+            if (api_timing := metrics.timings.get("embedding_cache.api")) is not None:
+                metrics.record_time(
+                    "embedding_cache.saved", api_timing.total / api_timing.count
+                )
+
+            return embedding
+
+        metrics.miss("embedding_cache")
+
+        with metrics.timed("embedding_cache.api"):
+            embedding = await self.embeddings.aembed_query(query)
+
+        await self.cache.put(model, query, embedding)
+        return embedding
+
+
+playbook_retriever = PlaybookRetriever(
+    PLAYBOOK_INDEX,
+    max_concurrency=int(os.getenv("RETRIEVAL_CONCURRENCY", 8)),
+    cache=EmbeddingCache(
+        os.getenv("EMBEDDING_CACHE_PATH") or None,
+        max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", 1024)),
+    ),
+    local_path=os.getenv("PLAYBOOK_INDEX_PATH") or None,
+    hnsw=os.getenv("PLAYBOOK_INDEX_HNSW") in ("true", "1"),
+    lexical_path=os.getenv("PLAYBOOK_LEXICAL_INDEX_PATH") or None,
+)
@@ -0,0 +1,137 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from redis import asyncio as redis
+
+# sets KEYS[1] to ARGV[1] only if it still holds ARGV[2], or doesn't exist
+# when ARGV[3] is "1"
+COMPARE_AND_SET = """
+local current = redis.call("GET", KEYS[1])
+if ARGV[3] == "1" then
+    if current then return 0 end
+elseif current ~= ARGV[2] then
+    return 0
+end
+redis.call("SET", KEYS[1], ARGV[1], "EX", ARGV[4])
+return 1
+"""
+
+
+class StateStore(ABC):
+    # whether other replicas see the same data, i.e. it survives this process
+    shared = False
+
+    @abstractmethod
+    async def get(self, key: str) -> bytes | None:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes) -> None:
+        ...
+
+    @abstractmethod
+    async def compare_and_set(
+        self, key: str, value: bytes, expected: bytes | None
+    ) -> bool:
+        # atomic, fails if another writer replaced `expected` in the meantime
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        ...
+
+
+class MemoryStateStore(StateStore):
+    def __init__(self, ttl: float, max_entries: int | None = None) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+
+    async def get(self, key: str) -> bytes | None:
+        self.expire()
+
+        if (entry := self.entries.get(key)) is None:
+            return None
+
+        return entry[1]
+
+    async def set(self, key: str, value: bytes) -> None:
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        self.expire()
+
+    async def compare_and_set(
+        self, key: str, value: bytes, expected: bytes | None
+    ) -> bool:
+        if await self.get(key) != expected:
+            return False
+
+        await self.set(key, value)
+        return True
+
+    async def delete(self, key: str) -> None:
+        self.entries.pop(key, None)
+
+    def expire(self) -> None:
+        now = time.monotonic()
+
+        # ordered by last write, so the oldest entries come first
+        while self.entries and next(iter(self.entries.values()))[0] <= now:
+            self.entries.popitem(last=False)
+
+        if self.max_entries is not None:
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+class RedisStateStore(StateStore):
+    shared = True
+
+    def __init__(self, client: redis.Redis, ttl: float, prefix: str = "chat:") -> None:
+        self.client = client
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self.compare_and_set_script = client.register_script(COMPARE_AND_SET)
+
+    @classmethod
+    def from_url(cls, url: str, ttl: float, prefix: str = "chat:") -> "RedisStateStore":
+        return cls(redis.Redis.from_url(url), ttl, prefix)
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key: str, value: bytes) -> None:
+        await self.client.set(self.prefix + key, value, ex=self.ttl)
+
+    async def compare_and_set(
+        self, key: str, value: bytes, expected: bytes | None
+    ) -> bool:
+        missing = "1" if expected is None else "0"
+        return bool(
+            await self.compare_and_set_script(
+                keys=[self.prefix + key],
+                args=[value, expected or b"", missing, self.ttl],
+            )
+        )
+
+    async def delete(self, key: str) -> None:
+        await self.client.delete(self.prefix + key)
+
+
+def create_state_store(
+    url: str | None,
+    ttl: float,
+    prefix: str = "chat:",
+    max_entries: int | None = None,
+) -> StateStore | None:
+    if not url:
+        return None
+
+    if url == "memory://":
+        return MemoryStateStore(ttl, max_entries)
+
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStateStore.from_url(url, ttl, prefix)
+
+    raise ValueError(f"Unsupported conversation store: {url}")
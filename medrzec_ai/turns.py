@@ -0,0 +1,99 @@
+import asyncio
+import json
+import time
+import traceback
+from collections.abc import Awaitable, Callable
+from enum import StrEnum, auto
+from typing import Any
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from .state_store import StateStore
+from .utils import metrics
+
+FAILED_DETAIL = "Failed to generate a reply, sorry."
+ABANDONED_DETAIL = "The server restarted during this turn, please send it again."
+
+
+class TurnStatus(StrEnum):
+    PENDING = auto()
+    DONE = auto()
+    FAILED = auto()
+
+
+class TurnResults:
+    # results of turns that run in the background, polled by the client;
+    # in a shared store any replica can answer the poll
+    def __init__(self, store: StateStore, poll_interval: float = 0.5) -> None:
+        self.store = store
+        self.poll_interval = poll_interval
+        self.tasks: dict[str, asyncio.Task[None]] = {}
+
+    async def get(self, key: str) -> dict[str, Any] | None:
+        if (data := await self.store.get(key)) is None:
+            return None
+
+        return json.loads(data)
+
+    async def set(self, key: str, record: dict[str, Any]) -> None:
+        await self.store.set(key, json.dumps(record).encode())
+
+    async def submit(self, key: str, turn: Callable[[], Awaitable[BaseModel]]) -> None:
+        await self.set(key, {"status": TurnStatus.PENDING})
+        metrics.increment("turns.submitted")
+
+        task = asyncio.create_task(self.run(key, turn))
+        self.tasks[key] = task
+        task.add_done_callback(lambda _: self.tasks.pop(key, None))
+
+    async def run(self, key: str, turn: Callable[[], Awaitable[BaseModel]]) -> None:
+        started = time.perf_counter()
+
+        try:
+            response = await turn()
+        except HTTPException as e:
+            await self.fail(key, e.status_code, e.detail)
+        except Exception:
+            traceback.print_exc()
+            await self.fail(key, 500, FAILED_DETAIL)
+        else:
+            await self.set(key, {"status": TurnStatus.DONE, "result": response.dict()})
+        finally:
+            metrics.record_time("turns.duration", time.perf_counter() - started)
+
+    async def fail(self, key: str, status: int, detail: str) -> None:
+        metrics.increment("turns.failed")
+        await self.set(
+            key,
+            {
+                "status": TurnStatus.FAILED,
+                "error": {"status": status, "detail": detail},
+            },
+        )
+
+    async def wait(self, key: str, timeout: float) -> dict[str, Any] | None:
+        # long polling, returns early once the turn has finished
+        deadline = time.monotonic() + timeout
+
+        while (record := await self.get(key)) is not None:
+            remaining = deadline - time.monotonic()
+
+            if record["status"] != TurnStatus.PENDING or remaining <= 0:
+                break
+
+            if (task := self.tasks.get(key)) is not None:
+                await asyncio.wait({task}, timeout=remaining)
+            else:  # running on another replica
+                await asyncio.sleep(min(self.poll_interval, remaining))
+
+        return record
+
+    def busy(self) -> bool:
+        return bool(self.tasks)
+
+    async def abandon(self) -> None:
+        # on shutdown, so that clients stop polling turns that will never finish
+        for key, task in list(self.tasks.items()):
+            task.cancel()
+            await self.fail(key, 503, ABANDONED_DETAIL)
@@ -0,0 +1,145 @@
+import dataclasses
+import json
+import os
+import random
+import time
+from typing import Any
+from uuid import UUID
+
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.chat_models import ChatOpenAI
+from langchain.llms import OpenAI
+
+from . import metrics
+from .streaming import AgentFinalAnswer, PlainText, TextFilter, TokenForwarder
+
+
+@dataclasses.dataclass(frozen=True)
+class Route:
+    model: str
+    temperature: float
+    max_tokens: int | None = None
+    timeout: float | None = None
+    # relative share of new chats when a role has several routes (A/B tests)
+    weight: float = 1.0
+
+
+DEFAULT_ROUTES: dict[str, list[Route]] = {
+    "awesome": [Route("gpt-4", temperature=1)],
+    "playbook": [Route("gpt-4", temperature=0.9)],
+    "question_chat": [Route("gpt-4", temperature=1)],
+    "remote_work_score.question_asker": [Route("gpt-4", temperature=1)],
+    "remote_work_score.response_parser": [Route("gpt-4", temperature=1)],
+    # only has to answer with a stage number
+    "sales.stage_analyzer": [
+        Route("gpt-3.5-turbo", temperature=0, max_tokens=8, timeout=20)
+    ],
+    "sales.conversation": [Route("gpt-4", temperature=0.5)],
+}
+
+# roles whose replies reach the user, streamed to /stream endpoints as generated
+STREAMED_ROLES: dict[str, type[TextFilter]] = {
+    "awesome": PlainText,
+    "playbook": AgentFinalAnswer,
+    "question_chat": PlainText,
+    "remote_work_score.question_asker": PlainText,
+    "sales.conversation": PlainText,
+}
+
+
+def load_routes(config: str | None) -> dict[str, list[Route]]:
+    routes = dict(DEFAULT_ROUTES)
+
+    if not config:
+        return routes
+
+    for role, role_routes in json.loads(config).items():
+        if role not in routes:
+            raise ValueError(f"Unknown LLM route role: {role}")
+
+        if isinstance(role_routes, dict):
+            role_routes = [role_routes]
+
+        routes[role] = [Route(**route) for route in role_routes]
+
+    return routes
+
+
+ROUTES = load_routes(os.getenv("LLM_ROUTES"))
+
+
+def pick_route(role: str) -> Route:
+    role_routes = ROUTES[role]
+    return random.choices(role_routes, [route.weight for route in role_routes])[0]
+
+
+def chat_llm(role: str) -> ChatOpenAI:
+    route = pick_route(role)
+    return ChatOpenAI(
+        model=route.model,
+        temperature=route.temperature,
+        max_tokens=route.max_tokens,
+        request_timeout=route.timeout,
+        streaming=role in STREAMED_ROLES,
+        callbacks=callbacks(role, route),
+        client=None,
+    )
+
+
+def completion_llm(role: str) -> OpenAI:
+    route = pick_route(role)
+    options: dict[str, Any] = {}
+
+    if route.max_tokens is not None:
+        options["max_tokens"] = route.max_tokens
+
+    return OpenAI(
+        model_name=route.model,
+        temperature=route.temperature,
+        request_timeout=route.timeout,
+        streaming=role in STREAMED_ROLES,
+        callbacks=callbacks(role, route),
+        **options,
+    )
+
+
+def callbacks(role: str, route: Route) -> list[BaseCallbackHandler]:
+    handlers: list[BaseCallbackHandler] = [LatencyRecorder(role, route.model)]
+
+    if (text_filter := STREAMED_ROLES.get(role)) is not None:
+        handlers.append(TokenForwarder(text_filter))
+
+    return handlers
+
+
+def latency_report() -> dict[str, dict[str, dict[str, float]]]:
+    report: dict[str, dict[str, dict[str, float]]] = {}
+
+    for name, timing in metrics.timings.items():
+        if name.startswith("llm."):
+            role, _, model = name.removeprefix("llm.").partition(":")
+            report.setdefault(role, {})[model] = timing.as_dict()
+
+    return report
+
+
+class LatencyRecorder(BaseCallbackHandler):
+    run_inline = True
+
+    def __init__(self, role: str, model: str) -> None:
+        self.name = f"llm.{role}:{model}"
+        self.started: dict[UUID, float] = {}
+
+    def on_llm_start(self, serialized: Any, prompts: Any, *, run_id: UUID, **_):
+        self.started[run_id] = time.perf_counter()
+
+    def on_chat_model_start(self, serialized: Any, messages: Any, *, run_id: UUID, **_):
+        self.started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **_):
+        if (started := self.started.pop(run_id, None)) is not None:
+            metrics.record_time(self.name, time.perf_counter() - started)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **_):
+        self.started.pop(run_id, None)
+        metrics.increment(f"{self.name}.errors")
@@ -0,0 +1,74 @@
+import contextlib
+import dataclasses
+import time
+from collections import Counter
+from collections.abc import Iterator
+
+
+@dataclasses.dataclass
+class Timing:
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def as_dict(self) -> dict[str, float]:
+        return {
+            "count": self.count,
+            "avg_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "max_ms": self.max * 1000,
+            "total_ms": self.total * 1000,
+        }
+
+
+counters: Counter[str] = Counter()
+timings: dict[str, Timing] = {}
+
+
+def increment(name: str, value: int = 1) -> None:
+    counters[name] += value
+
+
+def record_time(name: str, seconds: float) -> None:
+    timings.setdefault(name, Timing()).record(seconds)
+
+
+@contextlib.contextmanager
+def timed(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_time(name, time.perf_counter() - start)
+
+
+def hit(name: str) -> None:
+    counters[f"{name}.hits"] += 1
+
+
+def miss(name: str) -> None:
+    counters[f"{name}.misses"] += 1
+
+
+def hit_rate(name: str) -> float:
+    hits = counters[f"{name}.hits"]
+    total = hits + counters[f"{name}.misses"]
+    return hits / total if total else 0.0
+
+
+def snapshot() -> dict:
+    tracked = {
+        name.rpartition(".")[0]
+        for name in counters
+        if name.endswith((".hits", ".misses"))
+    }
+
+    return {
+        "counters": dict(sorted(counters.items())),
+        "hit_rates": {name: hit_rate(name) for name in sorted(tracked)},
+        "timings": {name: timing.as_dict() for name, timing in sorted(timings.items())},
+    }
@@ -0,0 +1,253 @@
+import asyncio
+import dataclasses
+import json
+import re
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextvars import ContextVar
+from typing import Any, Protocol
+from uuid import UUID
+
+from fastapi import HTTPException
+from langchain.callbacks.base import BaseCallbackHandler
+from pydantic import BaseModel
+
+from . import metrics
+from .text_utils import EmojiReplacer, EmojiStream
+
+# the conversational agent answers with {"action": "Final Answer", "action_input": "..."}
+FINAL_ANSWER_RE = re.compile(
+    r'"action"\s*:\s*"Final Answer"\s*,\s*"action_input"\s*:\s*"'
+)
+JSON_ESCAPES = {"b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class TextFilter(Protocol):
+    # turns raw LLM tokens into the text the user will see
+    def feed(self, token: str) -> str:
+        ...
+
+    def flush(self) -> str:
+        ...
+
+
+class PlainText:
+    def feed(self, token: str) -> str:
+        return token
+
+    def flush(self) -> str:
+        return ""
+
+
+class AgentFinalAnswer:
+    # tool calls stay hidden, only the final answer's JSON string is decoded
+    def __init__(self) -> None:
+        self.buffer = ""
+        self.started = False
+        self.finished = False
+
+    def feed(self, token: str) -> str:
+        if self.finished:
+            return ""
+
+        self.buffer += token
+
+        if not self.started:
+            if (match := FINAL_ANSWER_RE.search(self.buffer)) is None:
+                return ""
+
+            self.started = True
+            self.buffer = self.buffer[match.end() :]
+
+        return self.decode()
+
+    def flush(self) -> str:
+        return ""
+
+    def decode(self) -> str:
+        text: list[str] = []
+        buffer, i = self.buffer, 0
+
+        while i < len(buffer):
+            char = buffer[i]
+
+            if char == '"':
+                self.finished = True
+                break
+
+            if char != "\\":
+                text.append(char)
+                i += 1
+                continue
+
+            # incomplete escapes wait for the next token
+            if i + 1 >= len(buffer):
+                break
+
+            if buffer[i + 1] != "u":
+                text.append(JSON_ESCAPES.get(buffer[i + 1], buffer[i + 1]))
+                i += 2
+                continue
+
+            if i + 6 > len(buffer):
+                break
+
+            code = int(buffer[i + 2 : i + 6], 16)
+
+            if 0xD800 <= code < 0xDC00:  # a surrogate pair, e.g. an emoji
+                if i + 12 > len(buffer):
+                    break
+
+                low = int(buffer[i + 8 : i + 12], 16)
+                code = 0x10000 + (code - 0xD800) * 0x400 + (low - 0xDC00)
+                i += 6
+
+            text.append(chr(code))
+            i += 6
+
+        self.buffer = buffer[i:]
+        return "".join(text)
+
+
+@dataclasses.dataclass
+class Draft:
+    text_filter: TextFilter
+    emojis: EmojiStream
+    message: int | None = None
+
+
+class TurnStream:
+    # server-sent events for one chat turn, see stream_turn
+    def __init__(self, emojis: EmojiReplacer) -> None:
+        self.emojis = emojis
+        self.loop = asyncio.get_running_loop()
+        self.events: asyncio.Queue[tuple[str, dict[str, Any]] | None]
+        self.events = asyncio.Queue()
+        self.drafts: dict[UUID, Draft] = {}
+        self.messages = 0
+        self.started = time.perf_counter()
+        self.first_token: float | None = None
+        self.closed = False
+
+    def emit(self, event: str, **data: Any) -> None:
+        if self.closed:
+            return
+
+        # LLM callbacks may run in worker threads
+        self.loop.call_soon_threadsafe(self.events.put_nowait, (event, data))
+
+    def token(self, run_id: UUID, text_filter: type[TextFilter], token: str) -> None:
+        if (draft := self.drafts.get(run_id)) is None:
+            draft = self.drafts[run_id] = Draft(text_filter(), self.emojis.stream())
+
+        self.write(draft, draft.emojis.feed(draft.text_filter.feed(token)))
+
+    def end(self, run_id: UUID, discarded: bool = False) -> None:
+        if (draft := self.drafts.pop(run_id, None)) is None:
+            return
+
+        self.write(draft, draft.emojis.feed(draft.text_filter.flush()))
+        self.write(draft, draft.emojis.flush())
+
+        if draft.message is not None:
+            self.emit("message_end", message=draft.message, discarded=discarded)
+
+    def send_message(self, text: str) -> None:
+        if not text:
+            return
+
+        draft = Draft(PlainText(), self.emojis.stream())
+        self.write(draft, self.emojis.replace_emojis(text))
+        self.emit("message_end", message=draft.message, discarded=False)
+
+    def write(self, draft: Draft, text: str) -> None:
+        if not text or self.closed:
+            return
+
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+            metrics.record_time(
+                "streaming.first_token", self.first_token - self.started
+            )
+
+        # numbered when the first visible text arrives, so hidden runs get none
+        if draft.message is None:
+            draft.message = self.messages
+            self.messages += 1
+            self.emit("message_start", message=draft.message)
+
+        self.emit("token", message=draft.message, text=text)
+
+    def close(self) -> None:
+        self.closed = True
+        self.loop.call_soon_threadsafe(self.events.put_nowait, None)
+
+
+current_stream: ContextVar[TurnStream | None] = ContextVar(
+    "current_stream", default=None
+)
+# turns keep running after a client disconnects, like non-streaming requests
+running_turns: set[asyncio.Task] = set()
+
+
+class TokenForwarder(BaseCallbackHandler):
+    run_inline = True
+
+    def __init__(self, text_filter: type[TextFilter]) -> None:
+        self.text_filter = text_filter
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **_):
+        if (stream := current_stream.get()) is not None:
+            stream.token(run_id, self.text_filter, token)
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **_):
+        if (stream := current_stream.get()) is not None:
+            stream.end(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **_):
+        if (stream := current_stream.get()) is not None:
+            stream.end(run_id, discarded=True)
+
+
+def send_message(text: str) -> None:
+    # for messages that are ready before the rest of the turn
+    if (stream := current_stream.get()) is not None:
+        stream.send_message(text)
+
+
+def format_event(event: str, data: dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def stream_turn(
+    turn: Callable[[], Awaitable[BaseModel]], emojis: EmojiReplacer
+) -> AsyncIterator[str]:
+    stream = TurnStream(emojis)
+
+    async def run() -> BaseModel:
+        current_stream.set(stream)
+
+        try:
+            return await turn()
+        finally:
+            stream.close()
+
+    task = asyncio.create_task(run())
+    running_turns.add(task)
+    task.add_done_callback(running_turns.discard)
+
+    while (event := await stream.events.get()) is not None:
+        yield format_event(*event)
+
+    try:
+        response = await asyncio.shield(task)
+    except HTTPException as e:
+        yield format_event("error", {"status": e.status_code, "detail": e.detail})
+        return
+    except Exception:
+        detail = "Failed to generate a reply, sorry."
+        yield format_event("error", {"status": 500, "detail": detail})
+        raise
+
+    metrics.record_time("streaming.turn", time.perf_counter() - stream.started)
+    yield format_event("done", response.dict())
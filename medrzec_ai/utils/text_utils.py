@@ -1,9 +1,18 @@
 import re
+from datetime import date
 
-from httpx import AsyncClient
+from httpx import AsyncClient, HTTPError
 from enum import Enum, auto
 
+from . import emoji_table
+
 CODEPOINT_RE = re.compile(r"\/unicode\/(?P<codepoints>[\da-f-]+)\.png", re.ASCII)
+# zero-width so that a `:token:` missing from the table doesn't swallow the
+# colon that may open the next one, e.g. "12:30:smile:"
+EMOJI_TOKEN_RE = re.compile(r"(?=(:[\w+-]+:))")
+# a trailing run that may still grow into a `:token:`, held back while streaming
+PARTIAL_EMOJI_RE = re.compile(r"[\w+:-]*:[\w+:-]*\Z")
+GITHUB_EMOJIS_URL = "https://api.github.com/emojis"
 
 PLAYBOOK_URL = "https://remotehow.notion.site/Remote-Work-Playbook-Template-b537fb9b503f4a0a9296774d464777d6"
 PLAYBOOK_UPSELL = (
@@ -18,25 +27,99 @@ class TextFormat(Enum):
 
 class EmojiReplacer:
     def __init__(self) -> None:
-        self.emojis: dict[str, str] = {}
+        self.emojis: dict[str, str] = emoji_table.EMOJIS
+        self.version = emoji_table.VERSION
 
     async def load_emojis(self, client: AsyncClient) -> None:
-        response = await client.get("https://api.github.com/emojis")
-        json: dict[str, str] = response.json()
-
-        for name, url in json.items():
-            if match := next(CODEPOINT_RE.finditer(url), None):
-                codepoints = match["codepoints"].split("-")
-                emoji = "".join(chr(int(codepoint, 16)) for codepoint in codepoints)
-                self.emojis[f":{name}:"] = emoji
-
+        try:
+            response = await client.get(GITHUB_EMOJIS_URL)
+            response.raise_for_status()
+            json: dict[str, str] = response.json()
+            emojis = parse_github_emojis(json)
+        # ValueError for a body that isn't JSON or not an object of URLs
+        except (HTTPError, ValueError) as e:
+            print(f"Emoji refresh failed, keeping table {self.version}: {e}")
+            return
+
+        if not emojis:
+            print(f"Emoji refresh returned nothing, keeping table {self.version}")
+            return
+
+        # a single assignment, so replace_emojis sees either the old or the new table
+        self.emojis = emojis
+        self.version = date.today().isoformat()
         print(f"Loaded {len(self.emojis)}/{len(json)} emoji replacements")
 
     def replace_emojis(self, text: str) -> str:
-        for name, emoji in self.emojis.items():
-            text = text.replace(name, emoji)
+        emojis = self.emojis
+
+        if not emojis or ":" not in text:
+            return text
+
+        parts: list[str] = []
+        position = 0
+
+        for match in EMOJI_TOKEN_RE.finditer(text):
+            start = match.start()
+
+            if start < position:
+                continue
+
+            name = match[1]
+
+            if (emoji := emojis.get(name)) is not None:
+                parts.append(text[position:start])
+                parts.append(emoji)
+                position = start + len(name)
+
+        if not parts:
+            return text
+
+        parts.append(text[position:])
+        return "".join(parts)
+
+    def stream(self) -> "EmojiStream":
+        return EmojiStream(self)
+
+
+class EmojiStream:
+    # replaces emojis in text that arrives in pieces, e.g. LLM tokens
+    def __init__(self, replacer: EmojiReplacer) -> None:
+        self.replacer = replacer
+        self.pending = ""
+
+    def feed(self, text: str) -> str:
+        text = self.pending + text
+
+        # tokens never contain other characters, so none spans the split
+        if match := PARTIAL_EMOJI_RE.search(text):
+            text, self.pending = text[: match.start()], match[0]
+        else:
+            self.pending = ""
+
+        return self.replacer.replace_emojis(text)
+
+    def flush(self) -> str:
+        text, self.pending = self.pending, ""
+        return self.replacer.replace_emojis(text)
+
+
+def parse_github_emojis(json: dict[str, str]) -> dict[str, str]:
+    if not isinstance(json, dict):
+        raise ValueError(f"expected an object of emoji URLs, got {type(json).__name__}")
+
+    emojis: dict[str, str] = {}
+
+    for name, url in json.items():
+        if not isinstance(url, str):
+            continue
+
+        if match := next(CODEPOINT_RE.finditer(url), None):
+            codepoints = match["codepoints"].split("-")
+            emoji = "".join(chr(int(codepoint, 16)) for codepoint in codepoints)
+            emojis[f":{name}:"] = emoji
 
-        return text
+    return emojis
 
 
 class ChatMemory:
@@ -0,0 +1,41 @@
+import json
+import sys
+from datetime import date
+from pathlib import Path
+
+import httpx
+
+from medrzec_ai.utils.text_utils import GITHUB_EMOJIS_URL, parse_github_emojis
+
+TABLE_PATH = Path(__file__).parent / "medrzec_ai" / "utils" / "emoji_table.py"
+
+
+def write_table(emojis: dict[str, str], version: str) -> None:
+    lines = [
+        "# Generated by update_emojis.py, do not edit by hand.",
+        "",
+        f"VERSION = {json.dumps(version)}",
+        "",
+        "EMOJIS: dict[str, str] = {",
+        *(
+            f"    {json.dumps(name)}: {json.dumps(emoji, ensure_ascii=False)},"
+            for name, emoji in sorted(emojis.items())
+        ),
+        "}",
+        "",
+    ]
+    TABLE_PATH.write_text("\n".join(lines), encoding="utf8")
+
+
+if __name__ == "__main__":
+    print("Fetching GitHub emojis…")
+    response = httpx.get(GITHUB_EMOJIS_URL)
+    response.raise_for_status()
+
+    emojis = parse_github_emojis(response.json())
+
+    if not emojis:
+        sys.exit("GitHub returned no usable emojis, keeping the current table.")
+
+    write_table(emojis, date.today().isoformat())
+    print(f"Wrote {len(emojis)} emojis to {TABLE_PATH}")
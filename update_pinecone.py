@@ -1,35 +1,247 @@
+import argparse
+import asyncio
+import itertools
 import os
-import sys
+from collections.abc import Container, Iterator, Sequence
 
 import dotenv
 import pinecone
-from langchain.document_loaders import TextLoader
 from langchain.embeddings.openai import OpenAIEmbeddings
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.vectorstores import Pinecone
+
+from medrzec_ai.ingestion import (
+    Checkpoint,
+    Chunk,
+    IngestionStats,
+    MemorySink,
+    PineconeSink,
+    VectorSink,
+    format_plan,
+    ingest,
+    iter_chunks,
+    plan_ingestion,
+    source_name,
+)
+from medrzec_ai.lexical_index import LEXICAL_INDEX_FILE, LexicalIndex
+from medrzec_ai.local_index import LocalIndex, write_local_index
 
 INDEX_NAME = "playbook"
+# the most ids a single Pinecone query can return
+MAX_TOP_K = 10_000
 
 dotenv.load_dotenv()
 
-pinecone.init(os.environ["PINECONE_API_KEY"], environment=os.environ["PINECONE_ENV"])
+parser = argparse.ArgumentParser()
+parser.add_argument("paths", nargs="+", metavar="path")
+parser.add_argument(
+    "--local-index",
+    metavar="DIR",
+    help="write a local index for PLAYBOOK_INDEX_PATH instead of uploading to Pinecone",
+)
+parser.add_argument("--dtype", choices=["float32", "int8"], default="float32")
+parser.add_argument(
+    "--dry-run", action="store_true", help="only print which chunks would change"
+)
+parser.add_argument(
+    "--full", action="store_true", help="clear the index and upload everything again"
+)
+parser.add_argument("--batch-size", type=int, default=100)
+parser.add_argument(
+    "--concurrency", type=int, default=4, help="embedding requests in flight"
+)
+parser.add_argument(
+    "--checkpoint", help="progress file, an interrupted run resumes from it"
+)
+parser.add_argument(
+    "--lexical-index",
+    metavar="FILE",
+    help="also write a BM25 index for PLAYBOOK_LEXICAL_INDEX_PATH "
+    f"(local indexes get one in {LEXICAL_INDEX_FILE} regardless)",
+)
+args = parser.parse_args()
+
 
+def all_chunks() -> Iterator[Chunk]:
+    return itertools.chain.from_iterable(iter_chunks(path) for path in args.paths)
 
-print("Clearing DB index…")
-pinecone.Index(INDEX_NAME).delete(delete_all=True)
 
-print("Splitting the document…")
-documents = TextLoader(
-    " ".join(sys.argv[1:]),
-    encoding="utf8",
-).load_and_split(CharacterTextSplitter(chunk_size=256, chunk_overlap=0))
+def query_ids(index: pinecone.Index, filter: dict) -> list[str]:
+    # pod indexes can't list ids, but a filtered query over all vectors can
+    dimension = index.describe_index_stats()["dimension"]
+    response = index.query(
+        vector=[1.0] + [0.0] * (dimension - 1), top_k=MAX_TOP_K, filter=filter
+    )
+    return [match["id"] for match in response["matches"]]
 
 
-print("Uploading chunks…")
-Pinecone.from_documents(
-    documents,
-    OpenAIEmbeddings(),  # pyright: ignore [reportGeneralTypeIssues]
-    index_name=INDEX_NAME,
-)
+def sources(path: str) -> list[str]:
+    # chunks uploaded before sources were normalized used the path as given
+    return list(dict.fromkeys([source_name(path), path]))
+
+
+def existing_pinecone_chunks(index: pinecone.Index) -> dict[str, str | None]:
+    existing: dict[str, str | None] = {}
+
+    for path in args.paths:
+        ids = query_ids(index, {"source": {"$in": sources(path)}})
+
+        if len(ids) == MAX_TOP_K:
+            raise SystemExit(f"More than {MAX_TOP_K} chunks from {path}, use --full")
+
+        existing.update(dict.fromkeys(ids))
+
+    return existing
+
+
+def other_documents_texts(index: pinecone.Index) -> list[str]:
+    # the lexical index has to cover every document in Pinecone, not only the
+    # ones passed this time
+    current = [source for path in args.paths for source in sources(path)]
+    ids = query_ids(index, {"source": {"$nin": current}})
+
+    if len(ids) == MAX_TOP_K:
+        raise SystemExit(
+            f"More than {MAX_TOP_K} chunks from other documents, "
+            "pass every document to build the lexical index"
+        )
+
+    return [text for text in fetch_texts(index, ids).values() if text is not None]
+
+
+def fetch_texts(index: pinecone.Index, ids: list[str]) -> dict[str, str | None]:
+    texts: dict[str, str | None] = {}
+
+    for start in range(0, len(ids), 100):
+        vectors = index.fetch(ids[start : start + 100])["vectors"]
+        texts.update(
+            {
+                id_: (vector["metadata"] or {}).get("text")
+                for id_, vector in vectors.items()
+            }
+        )
+
+    return texts
+
+
+def write_lexical_index(path: str, other_texts: Sequence[str] = ()) -> None:
+    texts = [chunk.text for chunk in all_chunks()] + list(other_texts)
+    LexicalIndex.build(texts).save(path)
+    print(f"Wrote the lexical index to {path}, {len(texts)} chunks")
+
+
+def run_pipeline(
+    sink: VectorSink, skip: Container[str], checkpoint: Checkpoint
+) -> IngestionStats:
+    if checkpoint.done:
+        print(f"Resuming, {len(checkpoint.done)} chunks were already embedded")
+
+    print("Embedding chunks…")
+    stats = asyncio.run(
+        ingest(
+            all_chunks(),
+            OpenAIEmbeddings(client=None),
+            sink,
+            skip=skip,
+            checkpoint=checkpoint,
+            batch_size=args.batch_size,
+            concurrency=args.concurrency,
+        )
+    )
+    print(stats)
+    return stats
+
+
+def update_local_index() -> None:
+    existing: dict[str, str | None] = {}
+    embeddings: dict[str, list[float]] = {}
+
+    if not args.full and os.path.exists(args.local_index):
+        local_index = LocalIndex(args.local_index)
+
+        for row, id_ in enumerate(local_index.ids or []):
+            existing[id_] = local_index.texts[row]
+            embeddings[id_] = local_index.embeddings[row].tolist()
+
+    if args.dry_run:
+        print(format_plan(plan_ingestion(list(all_chunks()), existing)))
+        return
+
+    # the index is only written at the end, so the checkpoint keeps embeddings
+    checkpoint = Checkpoint(
+        args.checkpoint or f".{INDEX_NAME}-local-ingest.checkpoint",
+        keep_embeddings=True,
+    )
+    sink = MemorySink()
+    stats = run_pipeline(sink, existing, checkpoint)
+
+    embeddings.update(
+        (id_, embedding)
+        for id_, embedding in checkpoint.done.items()
+        if embedding is not None
+    )
+    embeddings.update((id_, embedding) for id_, (_, embedding) in sink.vectors.items())
+    chunks = list(all_chunks())
+
+    write_local_index(
+        args.local_index,
+        [chunk.text for chunk in chunks],
+        [embeddings[chunk.id] for chunk in chunks],
+        args.dtype,
+        ids=[chunk.id for chunk in chunks],
+    )
+    checkpoint.remove()
+    write_lexical_index(
+        args.lexical_index or os.path.join(args.local_index, LEXICAL_INDEX_FILE)
+    )
+
+    removed = len(existing.keys() - stats.seen)
+    print(f"Wrote {len(chunks)} chunks to {args.local_index}, {removed} removed")
+
+
+def update_pinecone() -> None:
+    pinecone.init(
+        os.environ["PINECONE_API_KEY"], environment=os.environ["PINECONE_ENV"]
+    )
+    index = pinecone.Index(INDEX_NAME)
+    existing = {} if args.full else existing_pinecone_chunks(index)
+
+    if args.dry_run:
+        plan = plan_ingestion(list(all_chunks()), existing)
+        plan.removed = fetch_texts(index, list(plan.removed))
+        print(format_plan(plan))
+        return
+
+    # before the upload, so that a run that can't write it fails early
+    other_texts: list[str] = []
+
+    if args.lexical_index is not None and not args.full:
+        other_texts = other_documents_texts(index)
+
+    checkpoint = Checkpoint(args.checkpoint or f".{INDEX_NAME}-ingest.checkpoint")
+
+    if args.full and not checkpoint.done:
+        print("Clearing DB index…")
+        index.delete(delete_all=True)
+
+    stats = run_pipeline(PineconeSink(index), existing, checkpoint)
+
+    # only after the upsert, so that retrieval never sees a partial playbook
+    removed = list(existing.keys() - stats.seen)
+
+    if removed:
+        print(f"Deleting {len(removed)} stale chunks…")
+
+        for start in range(0, len(removed), 1000):
+            index.delete(ids=removed[start : start + 1000])
+
+    checkpoint.remove()
+
+    if args.lexical_index is not None:
+        write_lexical_index(args.lexical_index, other_texts)
+
+
+if args.local_index is not None:
+    update_local_index()
+else:
+    update_pinecone()
 
 print("Success!")
@@ -0,0 +1,50 @@
+import asyncio
+import sys
+
+import dotenv
+
+dotenv.load_dotenv()
+
+from medrzec_ai.flows.question_cache import question_cache
+from medrzec_ai.flows.remote_work_score import (
+    TeamRoles,
+    create_question_asker,
+    get_questions,
+    render_cached_question,
+)
+from medrzec_ai.utils.text_utils import TextFormat
+
+CONCURRENCY = 8
+
+
+async def main() -> None:
+    if "--force" in sys.argv:
+        question_cache.entries = {}
+
+    question_asker = create_question_asker()
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def render(
+        role: TeamRoles, text_format: TextFormat, questions: list, index: int
+    ) -> None:
+        async with semaphore:
+            await render_cached_question(
+                question_asker, role, text_format, questions, index
+            )
+
+    for role in TeamRoles:
+        for text_format in TextFormat:
+            print(f"Rendering {role.name} questions for {text_format.name}…")
+            questions = get_questions(role, text_format)
+            await asyncio.gather(
+                *(
+                    render(role, text_format, questions, i)
+                    for i in range(len(questions))
+                )
+            )
+
+    print(f"Saved {len(question_cache.load())} questions to {question_cache.path}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())